@@ -1,7 +1,31 @@
 
+import argparse
+import logging
 import os
 import re
 
+logger = logging.getLogger(__name__)
+
+# Matches "(YYYYMMDD).[video_id" in the organized .vtt filenames
+VTT_ID_RE = re.compile(r'\(\d{8}\)\.\[([a-zA-Z0-9_-]{11})\s*')
+
+def iter_vtt_entries(path):
+    """
+    Recursively yields os.DirEntry objects for .vtt files under path.
+    """
+    try:
+        it = os.scandir(path)
+    except OSError as e:
+        # os.walk ignored unreadable directories; so does this
+        logger.warning("Skipping unreadable directory %s: %s", path, e)
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_vtt_entries(entry.path)
+            elif entry.is_file() and entry.name.endswith(".vtt"):
+                yield entry
+
 def update_archive():
     """
     Updates the yt-dlp archive file to be in sync with the .vtt files.
@@ -9,42 +33,39 @@ def update_archive():
     subtitles_dir = "/home/reikoku/Build From Source/Gemini Taylor/YtSubtitlesMissions/subtitles"
     archive_path = os.path.join(subtitles_dir, "ytdl-archive.txt")
 
-    # 1. Get video IDs from .vtt files
-    vtt_files = []
-    for root, _, files in os.walk(subtitles_dir):
-        for file in files:
-            if file.endswith(".vtt"):
-                vtt_files.append(os.path.join(root, file))
-
-    print(f"Found {len(vtt_files)} .vtt files.")
-    print("-" * 30)
-    print("Extracting and printing video IDs...")
+    # 1. Get video IDs from .vtt files in a single pass over the tree
+    logger.info("Extracting video IDs...")
 
     vtt_ids = set()
-    regex = r'\(\d{8}\)\.\[([a-zA-Z0-9_-]{11})\s*'
+    vtt_file_count = 0
 
-    for vtt_file in vtt_files:
-        match = re.search(regex, vtt_file)
+    for entry in iter_vtt_entries(subtitles_dir):
+        vtt_file_count += 1
+        match = VTT_ID_RE.search(entry.name)
         if match:
             video_id = match.group(1)
             vtt_ids.add(video_id)
-            print(f"- {os.path.basename(vtt_file)} -> {video_id}")
+            logger.debug("- %s -> %s", entry.name, video_id)
         else:
-            print(f"- {os.path.basename(vtt_file)} -> NOT FOUND")
+            logger.debug("- %s -> NOT FOUND", entry.name)
 
-    print("-" * 30)
-    print(f"Found {len(vtt_ids)} unique video IDs.")
+    logger.info("Found %d .vtt files.", vtt_file_count)
+    logger.info("-" * 30)
+    logger.info("Found %d unique video IDs.", len(vtt_ids))
 
     # 2. Generate the new archive content
-    new_archive_content = ""
-    for video_id in sorted(list(vtt_ids)):
-        new_archive_content += f"youtube {video_id}\n"
+    new_archive_content = "".join(f"youtube {video_id}\n" for video_id in sorted(vtt_ids))
 
     # 3. Write the new content to the archive file
     with open(archive_path, 'w') as f:
         f.write(new_archive_content)
     
-    print(f"\nSuccessfully updated ytdl-archive.txt with {len(vtt_ids)} entries.")
+    logger.info("Successfully updated ytdl-archive.txt with %d entries.", len(vtt_ids))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the yt-dlp archive file from the .vtt files on disk.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every processed file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(message)s")
     update_archive()
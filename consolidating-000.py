@@ -1,9 +1,23 @@
+import argparse
+import errno
+import logging
 import os
 import re
 import shutil
 
+logger = logging.getLogger(__name__)
+
+def rename_or_move(src, dst):
+    """Renames src to dst, copying with shutil.move only across devices."""
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
+
 def consolidate_subtitle_folders(base_dir):
-    print(f"Starting consolidation in: {base_dir}")
+    logger.info("Starting consolidation in: %s", base_dir)
     
     # Get all items in the base directory
     items = os.listdir(base_dir)
@@ -20,30 +34,41 @@ def consolidate_subtitle_folders(base_dir):
             parts = item.split('.')
             if len(parts) >= 2:
                 channel_id_uploader_id = f"{parts[0]}.{parts[1]}"
+
+                # Already a consolidated parent folder; moving it into itself would only fail
+                if item == channel_id_uploader_id:
+                    logger.debug("Skipping '%s': Already a consolidated parent folder.", item)
+                    continue
                 
                 new_parent_folder_path = os.path.join(base_dir, channel_id_uploader_id)
                 
                 # Create the new parent folder if it doesn't exist
                 if not os.path.exists(new_parent_folder_path):
                     os.makedirs(new_parent_folder_path)
-                    print(f"Created new parent folder: {new_parent_folder_path}")
+                    logger.debug("Created new parent folder: %s", new_parent_folder_path)
                 
                 # Move the original folder into the new parent folder
                 try:
-                    shutil.move(original_folder_path, new_parent_folder_path)
-                    print(f"Moved '{item}' to '{new_parent_folder_path}'")
+                    rename_or_move(original_folder_path, os.path.join(new_parent_folder_path, item))
+                    logger.debug("Moved '%s' to '%s'", item, new_parent_folder_path)
                 except shutil.Error as e:
-                    print(f"Error moving '{item}': {e}")
+                    logger.error("Error moving '%s': %s", item, e)
                 except Exception as e:
-                    print(f"An unexpected error occurred while moving '{item}': {e}")
+                    logger.error("An unexpected error occurred while moving '%s': %s", item, e)
             else:
-                print(f"Skipping '{item}': Does not match expected naming convention for consolidation.")
+                logger.debug("Skipping '%s': Does not match expected naming convention for consolidation.", item)
         elif os.path.isdir(original_folder_path):
-            print(f"Skipping non-UC folder or excluded folder: '{item}'")
+            logger.debug("Skipping non-UC folder or excluded folder: '%s'", item)
 
-    print("Consolidation complete.")
+    logger.info("Consolidation complete.")
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Group UC... subtitle folders under a channel_id.uploader_id parent folder.')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every moved or skipped folder.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(message)s')
+
     # Define the base directory for your subtitles
     subtitles_base_directory = '/home/reikoku/Build From Source/Gemini Taylor/YtSubtitlesMissions/subtitles'
     consolidate_subtitle_folders(subtitles_base_directory)
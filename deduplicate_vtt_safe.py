@@ -1,124 +1,319 @@
 import os
 import hashlib
+import mmap
 import argparse
+import logging
 import shutil
+import concurrent.futures
+import itertools
+import sqlite3
+from collections import defaultdict
 
-def calculate_file_hash(filepath, hash_algorithm='md5', block_size=65536):
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Files smaller than this are mapped and hashed with a single update() call
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.expanduser('~/.cache/ytsubs_dedup.sqlite')
+
+# Content hashes are only used to detect duplicates, so the fast non-cryptographic options are fine
+HASH_FACTORIES = {'md5': hashlib.md5}
+if blake3:
+    HASH_FACTORIES['blake3'] = blake3.blake3
+if xxhash:
+    HASH_FACTORIES['xxh3'] = xxhash.xxh3_64
+DEFAULT_HASH_ALGORITHM = 'blake3' if blake3 else 'md5'
+# Digest of zero bytes for each algorithm, so empty files never need to be opened
+EMPTY_DIGESTS = {name: factory().hexdigest() for name, factory in HASH_FACTORIES.items()}
+READ_BLOCK_SIZE = 65536
+# Same-sized files are first compared on a hash of their first bytes only
+HEAD_HASH_BYTES = 4096
+
+def calculate_file_hash(filepath, hash_algorithm=DEFAULT_HASH_ALGORITHM, file_size=None):
     """
     Calculates the hash of a file's content.
+    Pass file_size when the caller already has it to skip the extra fstat.
     """
-    hasher = hashlib.new(hash_algorithm)
+    if file_size == 0:
+        return EMPTY_DIGESTS[hash_algorithm]
+    hasher = HASH_FACTORIES[hash_algorithm]()
     try:
         with open(filepath, 'rb') as f:
-            for block in iter(lambda: f.read(block_size), b''):
-                hasher.update(block)
+            if file_size is None:
+                file_size = os.fstat(f.fileno()).st_size
+            if 0 < file_size < MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) as mm:
+                    if hasattr(mm, 'madvise'):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    hasher.update(mm)
+            else:
+                for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+                    hasher.update(block)
         return hasher.hexdigest()
     except FileNotFoundError:
-        print(f"Warning: File not found during hash calculation: {filepath}")
+        logger.warning("File not found during hash calculation: %s", filepath)
         return None
     except Exception as e:
-        print(f"Error calculating hash for {filepath}: {e}")
+        logger.error("Error calculating hash for %s: %s", filepath, e)
         return None
 
-def deduplicate_vtt_files_safe(base_dir, dry_run=True):
-    print(f"Starting safe deduplication in: {base_dir}")
+def calculate_head_hash(filepath, hash_algorithm=DEFAULT_HASH_ALGORITHM):
+    """
+    Calculates the hash of the first HEAD_HASH_BYTES of a file, as a cheap pre-filter before the full hash.
+    For files no larger than HEAD_HASH_BYTES this equals calculate_file_hash().
+    """
+    hasher = HASH_FACTORIES[hash_algorithm]()
+    try:
+        with open(filepath, 'rb') as f:
+            hasher.update(f.read(HEAD_HASH_BYTES))
+        return hasher.hexdigest()
+    except FileNotFoundError:
+        logger.warning("File not found during hash calculation: %s", filepath)
+        return None
+    except Exception as e:
+        logger.error("Error calculating hash for %s: %s", filepath, e)
+        return None
+
+def iter_vtt_entries(path, exclude_dir=None):
+    """
+    Recursively yields os.DirEntry objects for .vtt files under path.
+    The subtree rooted at exclude_dir (an absolute path), if given, is not descended into.
+    """
+    try:
+        it = os.scandir(path)
+    except OSError as e:
+        # Like os.walk, skip directories that can't be read (or vanished) instead of aborting
+        logger.warning("Skipping unreadable directory %s: %s", path, e)
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                if exclude_dir and os.path.abspath(entry.path) == exclude_dir:
+                    continue
+                yield from iter_vtt_entries(entry.path, exclude_dir)
+            elif entry.is_file() and entry.name.endswith('.vtt'):
+                yield entry
+
+def open_hash_cache(cache_path):
+    """
+    Opens (and creates if needed) the SQLite database caching file digests by (path, algorithm, size, mtime).
+    """
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(cache_path)
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS file_hashes '
+        '(path TEXT, algorithm TEXT, size INTEGER, mtime REAL, digest TEXT, PRIMARY KEY (path, algorithm))'
+    )
+    return conn
+
+def lookup_cached_hash(conn, filepath, stat_info, hash_algorithm):
+    """
+    Returns the cached digest for filepath if its size and mtime are unchanged, otherwise None.
+    """
+    row = conn.execute(
+        'SELECT size, mtime, digest FROM file_hashes WHERE path = ? AND algorithm = ?',
+        (filepath, hash_algorithm)
+    ).fetchone()
+    if row and row[0] == stat_info.st_size and row[1] == stat_info.st_mtime:
+        return row[2]
+    return None
+
+def move_to_quarantine(src, quarantine_dir):
+    """
+    Moves src into quarantine_dir without overwriting, appending _1, _2, ... to the name on collisions.
+    Returns the destination path.
+    """
+    filename = os.path.basename(src)
+    name, ext = os.path.splitext(filename)
+    for counter in itertools.count():
+        destination_path = os.path.join(quarantine_dir, filename if counter == 0 else f"{name}_{counter}{ext}")
+        try:
+            # link() fails with FileExistsError instead of silently replacing like rename() would
+            os.link(src, destination_path)
+        except FileExistsError:
+            continue
+        except OSError:
+            # No hard link possible (cross-device, or a filesystem/mount that doesn't
+            # support or allow them): reserve the name exclusively, then move over the placeholder
+            try:
+                os.close(os.open(destination_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                continue
+            try:
+                shutil.move(src, destination_path)
+            except BaseException:
+                os.unlink(destination_path)
+                raise
+            return destination_path
+        os.unlink(src)
+        return destination_path
+
+def default_thread_count():
+    """
+    Default worker count for hashing: I/O bound, so oversubscribe the CPUs.
+    """
+    return min(32, (os.cpu_count() or 1) * 4)
+
+def deduplicate_vtt_files_safe(base_dir, dry_run=True, threads=None, cache_path=DEFAULT_CACHE_PATH,
+                               hash_algorithm=DEFAULT_HASH_ALGORITHM):
+    logger.info("Starting safe deduplication in: %s", base_dir)
     if dry_run:
-        print("*** DRY RUN MODE: No files will be moved. ***")
+        logger.info("*** DRY RUN MODE: No files will be moved. ***")
 
     quarantine_dir = os.path.join(base_dir, "deduplicated_vtt_quarantine")
     if not os.path.exists(quarantine_dir) and not dry_run:
         os.makedirs(quarantine_dir)
-        print(f"Created quarantine directory: {quarantine_dir}")
+        logger.info("Created quarantine directory: %s", quarantine_dir)
 
-    # Dictionary to store file hashes and their paths
-    # {hash: set(filepath1, filepath2, ...)} - using a set to ensure unique paths
-    hashes = {}
+    # First path seen for every hash; most hashes are unique, so they only cost a single string
+    first_seen = {}
+    # {hash: [first_path, duplicate_path, ...]} - only populated when a hash collides
+    duplicates = {}
     # Set to store unique file identifiers (inode, device) to avoid processing the same physical file multiple times
     processed_file_ids = set()
+    # (normalized path, stat) pairs grouped by file size; only sizes shared by several files can hold duplicates
+    size_buckets = defaultdict(list)
     
-    # Walk through the directory tree
-    for dirpath, _, filenames in os.walk(base_dir):
-        for filename in filenames:
-            if filename.endswith('.vtt'):
-                filepath = os.path.join(dirpath, filename)
-                
-                try:
-                    # Get file's unique identifier (inode and device)
-                    stat_info = os.stat(filepath)
-                    file_id = (stat_info.st_ino, stat_info.st_dev)
-
-                    if file_id in processed_file_ids:
-                        # This physical file has already been processed, skip it
-                        # This handles cases where os.walk might yield the same file via different paths (e.g., hard links)
-                        # or if there's an anomaly causing the same path string to be yielded multiple times.
-                        # print(f"DEBUG: Skipping already processed physical file: {filepath}") # Uncomment for more verbose debug
-                        continue
-                    
-                    processed_file_ids.add(file_id)
-
-                    # Normalize the path to ensure consistent representation for storage
-                    normalized_filepath = os.path.realpath(filepath)
-                    
-                    file_hash = calculate_file_hash(normalized_filepath)
-                    if file_hash:
-                        if file_hash in hashes:
-                            hashes[file_hash].add(normalized_filepath)
-                        else:
-                            hashes[file_hash] = {normalized_filepath}
-                except FileNotFoundError:
-                    print(f"Warning: File not found during scan: {filepath}")
-                except Exception as e:
-                    print(f"Error processing file {filepath}: {e}")
+    # Walk through the directory tree, skipping files already moved to quarantine on previous runs
+    for entry in iter_vtt_entries(base_dir, os.path.abspath(quarantine_dir)):
+        filepath = entry.path
+
+        try:
+            # Get file's unique identifier (inode and device); DirEntry caches the stat result
+            stat_info = entry.stat()
+            file_id = (stat_info.st_ino, stat_info.st_dev)
+
+            if file_id in processed_file_ids:
+                # This physical file has already been processed, skip it
+                # This handles cases where the traversal might yield the same file via different paths (e.g., hard links)
+                # or if there's an anomaly causing the same path string to be yielded multiple times.
+                logger.debug("Skipping already processed physical file: %s", filepath)
+                continue
+
+            processed_file_ids.add(file_id)
+
+            # Normalize the path to ensure consistent representation for storage
+            size_buckets[stat_info.st_size].append((os.path.realpath(filepath), stat_info))
+        except FileNotFoundError:
+            logger.warning("File not found during scan: %s", filepath)
+        except Exception as e:
+            logger.error("Error processing file %s: %s", filepath, e)
+
+    candidates = [candidate for group in size_buckets.values() if len(group) > 1 for candidate in group]
+    logger.info("%d files share their size with another file and will be hashed.", len(candidates))
+
+    def record_hash(normalized_filepath, file_hash):
+        # Paths are already unique: each physical file was only queued once
+        if file_hash in first_seen:
+            duplicates.setdefault(file_hash, [first_seen[file_hash]]).append(normalized_filepath)
+        else:
+            first_seen[file_hash] = normalized_filepath
+
+    cache_conn = open_hash_cache(cache_path) if cache_path else None
+    new_cache_rows = []
+
+    # Files unchanged since the last run take their digest from the persistent cache without being opened
+    to_head_hash = []
+    cached_sizes = set()
+    for normalized_filepath, stat_info in candidates:
+        cached_hash = lookup_cached_hash(cache_conn, normalized_filepath, stat_info, hash_algorithm) if cache_conn else None
+        if cached_hash:
+            record_hash(normalized_filepath, cached_hash)
+            cached_sizes.add(stat_info.st_size)
+        else:
+            to_head_hash.append((normalized_filepath, stat_info))
+    logger.info("%d files reused a cached hash; %d need hashing.", len(candidates) - len(to_head_hash), len(to_head_hash))
+
+    # Hashing runs concurrently; results are collected in this thread so no lock is needed
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads or default_thread_count()) as executor:
+        # Stage 1: regroup same-sized files by a hash of their first bytes
+        head_buckets = defaultdict(list)
+        future_to_candidate = {
+            executor.submit(calculate_head_hash, normalized_filepath, hash_algorithm): (normalized_filepath, stat_info)
+            for normalized_filepath, stat_info in to_head_hash
+        }
+        for future in concurrent.futures.as_completed(future_to_candidate):
+            normalized_filepath, stat_info = future_to_candidate[future]
+            head_hash = future.result()
+            if head_hash:
+                head_buckets[(stat_info.st_size, head_hash)].append((normalized_filepath, stat_info))
+
+        # Stage 2: a full hash is only needed where the head hash still matches another
+        # uncached file, or where a cached file of the same size could be a duplicate
+        to_hash = []
+        for (file_size, head_hash), group in head_buckets.items():
+            if file_size <= HEAD_HASH_BYTES:
+                # The head hash already covers the whole file, so it is the full digest
+                for normalized_filepath, stat_info in group:
+                    record_hash(normalized_filepath, head_hash)
+                    new_cache_rows.append((normalized_filepath, hash_algorithm, stat_info.st_size, stat_info.st_mtime, head_hash))
+            elif len(group) > 1 or file_size in cached_sizes:
+                to_hash.extend(group)
+        logger.info("%d files need a full hash.", len(to_hash))
+
+        future_to_candidate = {
+            executor.submit(calculate_file_hash, normalized_filepath, hash_algorithm, stat_info.st_size): (normalized_filepath, stat_info)
+            for normalized_filepath, stat_info in to_hash
+        }
+        for future in concurrent.futures.as_completed(future_to_candidate):
+            normalized_filepath, stat_info = future_to_candidate[future]
+            file_hash = future.result()
+            if file_hash:
+                record_hash(normalized_filepath, file_hash)
+                new_cache_rows.append((normalized_filepath, hash_algorithm, stat_info.st_size, stat_info.st_mtime, file_hash))
+
+    if cache_conn:
+        # A single transaction for all new rows
+        with cache_conn:
+            cache_conn.executemany('INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?, ?)', new_cache_rows)
+        cache_conn.close()
 
     # Process duplicates
     moved_count = 0
-    for file_hash, filepaths_set in hashes.items():
-        # Convert set to list for consistent ordering (though not guaranteed)
-        filepaths = list(filepaths_set)
-        
-        # Debugging prints (can be removed after verification)
-        # print(f"\nDEBUG: Processing hash {file_hash}")
-        # print(f"DEBUG: filepaths_set (raw set): {filepaths_set}")
-        # for fp in filepaths_set:
-        #     print(f"DEBUG:   - repr(fp): {repr(fp)}, id(fp): {id(fp)}")
-
-        if len(filepaths) > 1:
-            print(f"\nFound {len(filepaths)} duplicates for hash {file_hash}:")
-            print(f"  Keeping: {filepaths[0]}") # Always keep the first encountered
-            
-            files_to_move = filepaths[1:] # Files to move to quarantine
-            for filepath_to_move in files_to_move:
-                # Construct new path in quarantine directory
-                # Use os.path.basename to get just the filename, then join with quarantine_dir
+    for file_hash, filepaths in duplicates.items():
+        logger.info("Found %d duplicates for hash %s:", len(filepaths), file_hash)
+        logger.info("  Keeping: %s", filepaths[0]) # Always keep the first encountered
+
+        files_to_move = filepaths[1:] # Files to move to quarantine
+        for filepath_to_move in files_to_move:
+            if dry_run:
                 destination_path = os.path.join(quarantine_dir, os.path.basename(filepath_to_move))
-                
-                # If a file with the same name already exists in quarantine, append a number
-                counter = 1
-                original_destination_path = destination_path
-                while os.path.exists(destination_path) and not dry_run:
-                    name, ext = os.path.splitext(original_destination_path)
-                    destination_path = f"{name}_{counter}{ext}"
-                    counter += 1
-
-                if dry_run:
-                    print(f"  [DRY RUN] Would move: {filepath_to_move} to {destination_path}")
-                    moved_count += 1 # <--- ADDED THIS LINE
-                else:
-                    try:
-                        shutil.move(filepath_to_move, destination_path)
-                        print(f"  Moved: {filepath_to_move} to {destination_path}")
-                        moved_count += 1
-                    except Exception as e:
-                        print(f"  Error moving {filepath_to_move}: {e}")
-
-    print(f"\nSafe deduplication complete. {'(Dry Run)' if dry_run else ''}")
-    print(f"Total files {'would be ' if dry_run else ''}moved to quarantine: {moved_count}")
+                logger.info("  [DRY RUN] Would move: %s to %s", filepath_to_move, destination_path)
+                moved_count += 1
+            else:
+                try:
+                    # Name collisions in quarantine are resolved by move_to_quarantine
+                    destination_path = move_to_quarantine(filepath_to_move, quarantine_dir)
+                    logger.info("  Moved: %s to %s", filepath_to_move, destination_path)
+                    moved_count += 1
+                except Exception as e:
+                    logger.error("  Error moving %s: %s", filepath_to_move, e)
+
+    logger.info("Safe deduplication complete. %s", '(Dry Run)' if dry_run else '')
+    logger.info("Total files %smoved to quarantine: %d", 'would be ' if dry_run else '', moved_count)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Safely find and move duplicate .vtt files based on content hash to a quarantine folder.')
     parser.add_argument('--base-dir', type=str, default='/home/reikoku/Build From Source/Gemini Taylor/YtSubtitlesMissions/subtitles', help='Base directory to search for .vtt files.')
     parser.add_argument('--dry-run', action='store_true', help='If set, no files will be moved, only reported.')
+    parser.add_argument('--threads', type=int, default=default_thread_count(), help='Number of worker threads used for hashing. Use a lower value on spinning disks.')
+    parser.add_argument('--cache-path', type=str, default=DEFAULT_CACHE_PATH, help='SQLite database caching file hashes between runs.')
+    parser.add_argument('--no-cache', action='store_true', help='If set, do not read or update the persistent hash cache.')
+    parser.add_argument('--hash', dest='hash_algorithm', choices=sorted(HASH_FACTORIES), default=DEFAULT_HASH_ALGORITHM, help='Content hash used to detect duplicates (blake3/xxh3 require the blake3/xxhash packages).')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every scanned file.')
 
     args = parser.parse_args()
 
-    deduplicate_vtt_files_safe(args.base_dir, args.dry_run)
\ No newline at end of file
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(message)s')
+    deduplicate_vtt_files_safe(args.base_dir, args.dry_run, args.threads, None if args.no_cache else args.cache_path,
+                               args.hash_algorithm)
\ No newline at end of file
@@ -1,51 +1,65 @@
+import argparse
+import concurrent.futures
+import errno
+import logging
 import os
 import re
 import shutil
 
+logger = logging.getLogger(__name__)
+
+# Maps every shell/file-system unsafe character to an underscore
+UNSAFE_CHARS_TRANS = str.maketrans(dict.fromkeys('$&|!*`"@~#', '_'))
+WHITESPACE_RE = re.compile(r'\s+')
+# Parses the whole filename in one pass; the channel_id (UC...) is the anchor between uploader and title
+# Groups: 1=upload_date, 2=video_id, 3=uploader_or_playlist, 4=channel_id, 5=title, 6=lang
+FILENAME_RE = re.compile(
+    r'^\((\d{8})\)\.\[([a-zA-Z0-9_-]+)\]\.(.+?)\.(UC[a-zA-Z0-9_-]+)\.(.*)\.([a-z]{2})\.cleaned\.vtt$'
+)
+
+def rename_or_move(src, dst):
+    """Moves src to dst with os.replace, or shutil.move when they are on different filesystems."""
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
+
 def sanitize_filename(filename):
     """
     Removes or replaces characters that can be problematic for shells or file systems.
     This version prefers spaces over underscores for readability, but replaces unsafe chars with underscores.
     """
     # Replace known problematic characters with an underscore
-    unsafe_chars = r'[$&|!*`"@~#]'
-    sanitized = re.sub(unsafe_chars, '_', filename)
+    sanitized = filename.translate(UNSAFE_CHARS_TRANS)
     # Replace multiple spaces with a single space, preserving single spaces
-    sanitized = re.sub(r'\s+', ' ', sanitized).strip()
+    sanitized = WHITESPACE_RE.sub(' ', sanitized).strip()
     return sanitized
 
-def organize_vtt_from_flat(source_flat_dir, destination_base_dir):
-    print(f"Starting organization from flat directory: {source_flat_dir}")
-    print(f"Organizing into base directory: {destination_base_dir}")
-
-    # Regex to extract the fixed date and video_id parts, and the rest of the filename
-    # This is the most robust way to handle the variable parts in between.
-    initial_pattern = re.compile(r'^\((\d{8})\)\.\[([a-zA-Z0-9_-]+)\]\.(.*)\.([a-z]{2})\.cleaned\.vtt$')
-    # Groups: 1=upload_date, 2=video_id, 3=content_before_lang, 4=lang
+def organize_vtt_from_flat(source_flat_dir, destination_base_dir, max_concurrency=8):
+    logger.info("Starting organization from flat directory: %s", source_flat_dir)
+    logger.info("Organizing into base directory: %s", destination_base_dir)
 
     processed_count = 0
     skipped_count = 0
-    for filename in os.listdir(source_flat_dir):
-        if filename.endswith('.vtt'):
-            source_filepath = os.path.join(source_flat_dir, filename)
-            match_initial = initial_pattern.match(filename)
-
-            if match_initial:
-                upload_date = match_initial.group(1)
-                video_id = match_initial.group(2)
-                content_before_lang = match_initial.group(3) # This part contains uploader_name.channel_id.title
-                lang = match_initial.group(4)
-
-                # Now, parse content_before_lang to extract uploader_name, channel_id, and title
-                # The channel_id (UC...) is a strong anchor to split around.
-                match_channel_id_and_rest = re.search(r'(UC[a-zA-Z0-9_-]+)\.(.*)$', content_before_lang)
-
-                if match_channel_id_and_rest:
-                    channel_id_raw = match_channel_id_and_rest.group(1)
-                    # The part before channel_id is uploader_name/playlist_name
-                    uploader_or_playlist_raw = content_before_lang[:match_channel_id_and_rest.start() - 1] # -1 to remove the dot before UC
-                    # The part after channel_id is title
-                    title_raw = match_channel_id_and_rest.group(2)
+    # First pass: plan every move as (filename, source, destination) and collect destination folders
+    planned_moves = []
+    # {folder_name: destination folder path}, so each folder path is joined and created only once
+    destination_folders = {}
+    with os.scandir(source_flat_dir) as it:
+        for entry in it:
+            filename = entry.name
+            if not entry.is_file():
+                logger.debug("Skipping '%s': Not a file.", filename)
+                skipped_count += 1
+                continue
+            if filename.endswith('.vtt'):
+                source_filepath = entry.path
+                match = FILENAME_RE.match(filename)
+
+                if match:
+                    upload_date, video_id, uploader_or_playlist_raw, channel_id_raw, title_raw, lang = match.groups()
 
                     # Sanitize extracted parts, preserving spaces as requested
                     uploader_or_playlist_clean = sanitize_filename(uploader_or_playlist_raw)
@@ -69,36 +83,53 @@ def organize_vtt_from_flat(source_flat_dir, destination_base_dir):
                     ]
                     final_filename = '.'.join(filter(None, final_filename_parts))
 
-                    destination_folder = os.path.join(destination_base_dir, folder_name)
+                    destination_folder = destination_folders.get(folder_name)
+                    if destination_folder is None:
+                        destination_folder = os.path.join(destination_base_dir, folder_name)
+                        destination_folders[folder_name] = destination_folder
                     destination_filepath = os.path.join(destination_folder, final_filename)
 
-                    # Create destination folder if it doesn't exist
-                    os.makedirs(destination_folder, exist_ok=True)
-
-                    # Move the file
-                    try:
-                        shutil.move(source_filepath, destination_filepath)
-                        print(f"Moved '{filename}' to '{destination_filepath}'")
-                        processed_count += 1
-                    except shutil.Error as e:
-                        print(f"Error moving '{filename}': {e}")
-                    except Exception as e:
-                        print(f"An unexpected error occurred while moving '{filename}': {e}")
+                    planned_moves.append((filename, source_filepath, destination_filepath))
                 else:
-                    print(f"Skipping '{filename}': Could not find channel ID (UC...) pattern in content part. Content: '{content_before_lang}'")
+                    logger.debug("Skipping '%s': Does not match the (date).[id].uploader.UC....title.lang.cleaned.vtt pattern.", filename)
                     skipped_count += 1
             else:
-                print(f"Skipping '{filename}': Does not match initial filename pattern. Filename: {filename}")
+                logger.debug("Skipping '%s': Not a .vtt file.", filename)
                 skipped_count += 1
-        else:
-            print(f"Skipping '{filename}': Not a .vtt file. Filename: {filename}")
-            skipped_count += 1
 
-    print(f"Organization complete. Total files processed: {processed_count}, Total files skipped: {skipped_count}")
+    # Create destination folders serially so the concurrent moves never race on makedirs
+    for destination_folder in destination_folders.values():
+        os.makedirs(destination_folder, exist_ok=True)
+
+    # Second pass: the moves are independent renames, so run them concurrently
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        future_to_move = {
+            executor.submit(rename_or_move, source_filepath, destination_filepath): (filename, destination_filepath)
+            for filename, source_filepath, destination_filepath in planned_moves
+        }
+        for future in concurrent.futures.as_completed(future_to_move):
+            filename, destination_filepath = future_to_move[future]
+            try:
+                future.result()
+                logger.debug("Moved '%s' to '%s'", filename, destination_filepath)
+                processed_count += 1
+            except shutil.Error as e:
+                logger.error("Error moving '%s': %s", filename, e)
+            except Exception as e:
+                logger.error("An unexpected error occurred while moving '%s': %s", filename, e)
+
+    logger.info("Organization complete. Total files processed: %d, Total files skipped: %d", processed_count, skipped_count)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move cleaned .vtt files from a flat directory into per-channel folders.')
+    parser.add_argument('-c', '--max-concurrency', type=int, default=8, help='Number of files moved concurrently.')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every moved or skipped file.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(message)s')
+
     # Define the source flat directory and the destination base directory
     source_flat_directory = '/home/reikoku/Build From Source/Gemini Taylor/YtSubtitlesMissions/subtitles/All subtitles transcripts'
     destination_base_directory = '/home/reikoku/Build From Source/Gemini Taylor/YtSubtitlesMissions/subtitles'
     
-    organize_vtt_from_flat(source_flat_directory, destination_base_directory)
\ No newline at end of file
+    organize_vtt_from_flat(source_flat_directory, destination_base_directory, args.max_concurrency)
\ No newline at end of file
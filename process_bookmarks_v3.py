@@ -1,56 +1,130 @@
 #!/usr/bin/env python3
 
 import os
+import errno
 import subprocess
 import argparse
 import re
 import shutil
 import json
-from bs4 import BeautifulSoup
+import concurrent.futures
+import itertools
+import functools
+import mmap
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    # Fall back to parsing the whole bookmarks file in memory
+    ijson = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    # Fall back to lxml when selectolax is not installed
+    LexborHTMLParser = None
+    from lxml import etree
+
+try:
+    import yt_dlp
+except ImportError:
+    # Fall back to running the yt-dlp executable
+    yt_dlp = None
+
+try:
+    # Optional Cython build of the cleaning loop (see setup_vtt_clean.py)
+    from vtt_clean import clean_vtt_lines as clean_vtt_lines_compiled
+except ImportError:
+    clean_vtt_lines_compiled = None
+
+UNSAFE_CHARS_TRANS = str.maketrans(dict.fromkeys('$&|!*`"@~#', '_'))
+HTML_TAG_RE = re.compile(r'<[^>]*>')
+# Any whitespace-delimited token containing a YouTube watch URL
+YOUTUBE_WATCH_URL_RE = re.compile(rb'\S*youtube\.com/watch\S*')
+# Video ID in the query string of a watch URL
+VIDEO_ID_RE = re.compile(r'[?&]v=([\w-]+)')
+# Prefixes of the WEBVTT header and metadata lines, checked on the raw bytes
+VTT_HEADER_PREFIXES = (b'WEBVTT', b'Kind:', b'Language:')
+# Write buffer for cleaned VTT output
+OUTPUT_BUFFER_SIZE = 1 << 20  # 1 MiB
+
+def rename_or_move(src, dst):
+    """Renames src to dst, or moves it with shutil.move when dst is on another device."""
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
+
+@functools.lru_cache(maxsize=4096)
 def sanitize_filename(filename):
     """
     Removes or replaces characters that can be problematic for shells or file systems.
+    Cached, since channel, uploader and playlist names repeat across many videos.
     """
     # Replace known problematic characters with an underscore
-    unsafe_chars = r'[$&|!*`"@~#]'
-    sanitized = re.sub(unsafe_chars, '_', filename)
-    # Replace multiple spaces with a single space
-    sanitized = re.sub(r'\s+', ' ', sanitized).strip()
-    return sanitized
+    sanitized = filename.translate(UNSAFE_CHARS_TRANS)
+    # Replace multiple spaces with a single space and trim the ends
+    return ' '.join(sanitized.split())
+
+def clean_vtt_lines_python(raw_lines):
+    """
+    Takes the raw byte lines of a VTT file and returns the cleaned, de-duplicated
+    lines prefixed with '- ' (without trailing newlines).
+    """
+    # hash() of each emitted line; ints are much smaller than keeping every line string around
+    seen_hashes = set()
+    output_lines = []
+    # Bind the compiled pattern to a local for the per-line loop
+    strip_tags = HTML_TAG_RE.sub
+    for raw_line in raw_lines:
+        # Skip header, metadata and timestamps
+        if raw_line.lstrip().startswith(VTT_HEADER_PREFIXES) or b'-->' in raw_line:
+            continue
+        # Strip HTML tags and " >>" which often appears as &gt;&gt;, then normalize
+        # whitespace; split()/join() collapses runs and trims the ends without the regex engine
+        line = ' '.join(strip_tags('', raw_line.decode('utf-8')).replace('&gt;&gt;', '').split())
+        # Skip blank lines that might result from cleaning
+        if not line:
+            continue
+        # Ensure uniqueness
+        line_hash = hash(line)
+        if line_hash not in seen_hashes:
+            seen_hashes.add(line_hash)
+            # Prepend with dash and space
+            output_lines.append(f'- {line}')
+    return output_lines
+
+clean_vtt_lines = clean_vtt_lines_compiled or clean_vtt_lines_python
 
 def clean_vtt_file_python(input_filepath, output_filepath):
     """
-    Applies cleaning operations to a VTT file using pure Python.
+    Applies cleaning operations to a VTT file.
     Removes WEBVTT header, metadata, timestamps, blank lines, HTML tags,
     and duplicate lines. Prepends lines with '- '.
+    Uses the vtt_clean extension when it is built, pure Python otherwise.
     """
-    seen_lines = set()
     try:
-        with open(input_filepath, 'r', encoding='utf-8') as infile, \
-             open(output_filepath, 'w', encoding='utf-8') as outfile:
-            for line in infile:
-                # Skip header and metadata
-                if line.strip() == 'WEBVTT' or 'Kind:' in line or 'Language:' in line:
-                    continue
-                # Skip timestamps
-                if '-->' in line:
-                    continue
-                # Strip HTML tags
-                line = re.sub(r'<[^>]*>', '', line)
-                # Strip " >>" which often appears as &gt;&gt;
-                line = line.replace('&gt;&gt;', '')
-                # Normalize whitespace and strip leading/trailing space
-                line = re.sub(r'\s+', ' ', line).strip()
-                # Skip blank lines that might result from cleaning
-                if not line:
-                    continue
-                # Prepend with dash and space
-                line_to_check = f'- {line}'
-                # Ensure uniqueness
-                if line_to_check not in seen_lines:
-                    outfile.write(line_to_check + '\n')
-                    seen_lines.add(line_to_check)
+        # Map the file and split it on line boundaries in C; only lines that survive
+        # the header/timestamp check are decoded
+        with open(input_filepath, 'rb') as infile:
+            if os.fstat(infile.fileno()).st_size:
+                with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    raw_lines = mm[:].splitlines()
+            else:
+                raw_lines = []
+        output_lines = clean_vtt_lines(raw_lines)
+        # One contiguous write per file through a large buffer instead of many small writes
+        with open(output_filepath, 'w', encoding='utf-8', buffering=OUTPUT_BUFFER_SIZE) as outfile:
+            if output_lines:
+                outfile.write('\n'.join(output_lines))
+                outfile.write('\n')
         print(f"Cleaned '{input_filepath}' to '{output_filepath}'")
         return True
     except Exception as e:
@@ -59,60 +133,174 @@ def clean_vtt_file_python(input_filepath, output_filepath):
 
 def extract_urls_from_json(json_file):
     """Extracts YouTube URLs from a JSON bookmarks file."""
+    if ijson is not None:
+        return extract_urls_from_json_stream(json_file)
+
     urls = []
-    with open(json_file, 'r', encoding='utf-8') as f:
-        bookmarks = json.load(f)
-    
-    def find_urls(node):
+    with open(json_file, 'rb') as f:
+        data = f.read()
+    bookmarks = orjson.loads(data) if orjson else json.loads(data)
+
+    # Iterative depth-first walk; children are pushed in reverse so URLs keep document order
+    stack = [bookmarks]
+    while stack:
+        node = stack.pop()
         if isinstance(node, dict):
-            if node.get('type') == 'url' and 'url' in node and 'youtube.com/watch' in node['url']:
-                urls.append(node['url'])
-            for key, value in node.items():
-                find_urls(value)
+            url = node.get('url')
+            if node.get('type') == 'url' and url and 'youtube.com/watch' in url:
+                urls.append(url)
+            stack.extend(reversed(node.values()))
         elif isinstance(node, list):
-            for item in node:
-                find_urls(item)
+            stack.extend(reversed(node))
+    return urls
 
-    find_urls(bookmarks)
+def extract_urls_from_json_stream(json_file):
+    """
+    Same as extract_urls_from_json, but streams parser events with ijson instead of
+    building the whole bookmarks tree, so memory stays flat for large exports.
+    """
+    urls = []
+    # One [type, url] pair per open JSON object; only those two keys are ever kept
+    open_objects = []
+    key = None
+    with open(json_file, 'rb') as f:
+        for _, event, value in ijson.parse(f):
+            if event == 'map_key':
+                key = value
+            elif event == 'start_map':
+                open_objects.append([None, None])
+            elif event == 'end_map':
+                node_type, url = open_objects.pop()
+                if node_type == 'url' and url and 'youtube.com/watch' in url:
+                    urls.append(url)
+            elif event == 'string' and open_objects:
+                if key == 'type':
+                    open_objects[-1][0] = value
+                elif key == 'url':
+                    open_objects[-1][1] = value
     return urls
 
 def extract_urls_from_html(html_file):
     """Extracts YouTube URLs from an HTML bookmarks file."""
+    if LexborHTMLParser:
+        # A single CSS selector evaluated entirely in C by Lexbor
+        with open(html_file, 'rb') as f:
+            tree = LexborHTMLParser(f.read())
+        return [node.attributes.get('href') for node in tree.css('a[href*="youtube.com/watch"]')]
+
     urls = []
-    with open(html_file, 'r', encoding='utf-8') as f:
-        soup = BeautifulSoup(f, 'html.parser')
-    
-    for a in soup.find_all('a', href=True):
-        if 'youtube.com/watch' in a['href']:
-            urls.append(a['href'])
+    # libxml2's HTML parser builds the tree in C; iter('a') walks it without listing every element.
+    # huge_tree lifts libxml2's nesting limit: bookmark exports never close <DT>/<p>, so they nest very deeply.
+    tree = etree.parse(html_file, etree.HTMLParser(encoding='utf-8', huge_tree=True))
+    for a in tree.iter('a'):
+        href = a.get('href')
+        if href and 'youtube.com/watch' in href:
+            urls.append(href)
     return urls
 
 def extract_urls_from_txt(txt_file):
     """Extracts URLs from a plain text file."""
-    urls = []
-    with open(txt_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line and 'youtube.com/watch' in line:
-                urls.append(line)
-    return urls
+    # One regex scan over the raw bytes; only the matches are decoded
+    with open(txt_file, 'rb') as f:
+        data = f.read()
+    return [match.group(0).decode('utf-8') for match in YOUTUBE_WATCH_URL_RE.finditer(data)]
 
-def download_and_organize_subtitles(batch_file, sub_langs, output_path):
+def filter_archived_urls(urls, archive_path):
     """
-    Downloads subtitles and then organizes them into folders by channel handle.
+    Drops URLs whose video ID is already recorded in the yt-dlp archive ('youtube <id>' lines),
+    so yt-dlp never spends a request and its sleep intervals on them.
     """
-    temp_dir = os.path.join(output_path, 'temp_subtitles')
-    os.makedirs(temp_dir, exist_ok=True)
+    if not os.path.exists(archive_path):
+        return urls
+    with open(archive_path, 'r', encoding='utf-8') as f:
+        archived_ids = {parts[1] for parts in map(str.split, f) if len(parts) == 2 and parts[0] == 'youtube'}
 
-    # --- Pass 1: Download all subtitles to a temporary directory ---
-    print("---" + " Starting Pass 1: Downloading all subtitles ---")
-    download_command = [
+    filtered_urls = []
+    for url in urls:
+        match = VIDEO_ID_RE.search(url)
+        if match is None or match.group(1) not in archived_ids:
+            filtered_urls.append(url)
+    return filtered_urls
+
+def organize_subtitle_file(json_path, vtt_path, lang, output_path):
+    """
+    Cleans one downloaded VTT file and moves it into its channel folder, named from its .info.json metadata.
+    Runs in a worker process, so it must stay a picklable top-level function.
+    """
+    vtt_filename = os.path.basename(vtt_path)
+    # Read the .info.json as bytes and decode it in one call (orjson when installed)
+    with open(json_path, 'rb') as f:
+        data = f.read()
+    metadata = orjson.loads(data) if orjson else json.loads(data)
+
+    # Extract data from metadata
+    upload_date = metadata.get('upload_date', '')
+    video_id = metadata.get('id', '')
+    playlist = metadata.get('playlist', '')
+    uploader_id = metadata.get('uploader_id', '')
+    channel_id = metadata.get('channel_id', '')
+    title = metadata.get('title', '')
+    ext = 'vtt'
+
+    # Sanitize parts for final filename and folder name
+    playlist_clean = sanitize_filename(playlist)
+    uploader_id_clean = sanitize_filename(uploader_id.replace('@', ''))
+    channel_id_clean = sanitize_filename(channel_id)
+    title_clean = sanitize_filename(title)
+
+    # Construct final clean filename
+    final_filename_parts = [
+        f"({upload_date})",
+        f"[{video_id}]",
+        playlist_clean,
+        uploader_id_clean,
+        channel_id_clean,
+        title_clean,
+        lang,
+        'cleaned',
+        ext
+    ]
+    final_filename = '.'.join(filter(None, final_filename_parts))
+
+    # Construct final folder name
+    folder_name_parts = [channel_id_clean, uploader_id_clean, playlist_clean]
+    folder_name = '.'.join(filter(None, folder_name_parts))
+
+    if not folder_name:
+        print(f"Could not determine a valid directory name for {vtt_filename}. Leaving in temp folder.")
+        os.remove(json_path) # remove json file
+        return
+
+    # Clean the VTT file
+    cleaned_temp_path = vtt_path.replace('.vtt', '.cleaned.vtt')
+    if clean_vtt_file_python(vtt_path, cleaned_temp_path):
+        os.remove(vtt_path)
+    else:
+        print(f"Skipping organization for failed-to-clean file: {vtt_filename}")
+        os.remove(json_path) # remove json file
+        return
+
+    # Move and rename the cleaned file
+    channel_dir = os.path.join(output_path, folder_name)
+    os.makedirs(channel_dir, exist_ok=True)
+    dest_path = os.path.join(channel_dir, final_filename)
+
+    print(f"Moving and renaming {cleaned_temp_path} to {dest_path}")
+    try:
+        rename_or_move(cleaned_temp_path, dest_path)
+        os.remove(json_path) # remove json file
+    except FileNotFoundError:
+        print(f"Error moving file: {cleaned_temp_path} not found.")
+
+def build_download_command(batch_file, archive_path, sub_langs, temp_dir):
+    """Builds the yt-dlp command line for one batch file."""
+    return [
         'yt-dlp',
         '--windows-filenames',
         '--restrict-filenames',
         '--progress',
         '--batch-file', batch_file,
-        '--download-archive', os.path.abspath(os.path.join(output_path, 'ytdl-archive.txt')),
+        '--download-archive', archive_path,
         '--force-write-archive',
         '--sleep-interval', '8',
         '--max-sleep-interval', '13',
@@ -130,91 +318,146 @@ def download_and_organize_subtitles(batch_file, sub_langs, output_path):
         '--break-per-input'
     ]
 
-    try:
+def run_download_in_process(download_command):
+    """
+    Runs a yt-dlp command line through the yt_dlp Python API and returns its exit code.
+    The arguments go through yt-dlp's own option parser, so the options match the CLI exactly.
+    """
+    parsed = yt_dlp.parse_options(download_command[1:])
+    with yt_dlp.YoutubeDL(parsed.ydl_opts) as ydl:
+        return ydl.download(parsed.urls)
+
+def split_batch_file(batch_file, archive_path, shard_count):
+    """
+    Splits batch_file round-robin into shard_count batch files, each with its own copy of the archive.
+    Returns (shard_files, shard_archives).
+    """
+    with open(batch_file, 'r', encoding='utf-8') as f:
+        urls = [line for line in f if line.strip()]
+    shard_count = max(1, min(shard_count, len(urls)))
+
+    shard_files = []
+    shard_archives = []
+    for i in range(shard_count):
+        shard_file = f"{batch_file}.shard{i}"
+        with open(shard_file, 'w', encoding='utf-8') as f:
+            f.writelines(urls[i::shard_count])
+        shard_files.append(shard_file)
+
+        # yt-dlp appends to its archive while running, so every shard gets a private copy to write to
+        shard_archive = f"{archive_path}.shard{i}"
+        if os.path.exists(archive_path):
+            shutil.copyfile(archive_path, shard_archive)
+        shard_archives.append(shard_archive)
+    return shard_files, shard_archives
+
+def merge_shard_archives(archive_path, shard_archives):
+    """Appends the entries each shard added to the main archive, then removes the shard archives."""
+    known_entries = set()
+    if os.path.exists(archive_path):
+        with open(archive_path, 'r', encoding='utf-8') as f:
+            known_entries.update(line.strip() for line in f)
+
+    new_entries = []
+    for shard_archive in shard_archives:
+        if not os.path.exists(shard_archive):
+            continue
+        with open(shard_archive, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = line.strip()
+                if entry and entry not in known_entries:
+                    known_entries.add(entry)
+                    new_entries.append(entry + '\n')
+        os.remove(shard_archive)
+
+    with open(archive_path, 'a', encoding='utf-8') as f:
+        f.writelines(new_entries)
+
+def download_and_organize_subtitles(batch_file, sub_langs, output_path, clean_workers=None, download_workers=1):
+    """
+    Downloads subtitles and then organizes them into folders by channel handle.
+    """
+    temp_dir = os.path.join(output_path, 'temp_subtitles')
+    os.makedirs(temp_dir, exist_ok=True)
+
+    # --- Pass 1: Download all subtitles to a temporary directory ---
+    print("---" + " Starting Pass 1: Downloading all subtitles ---")
+    archive_path = os.path.abspath(os.path.join(output_path, 'ytdl-archive.txt'))
+    if download_workers > 1:
+        shard_files, shard_archives = split_batch_file(batch_file, archive_path, download_workers)
+    else:
+        shard_files, shard_archives = [batch_file], [archive_path]
+
+    download_commands = [build_download_command(shard_file, shard_archive, sub_langs, temp_dir)
+                         for shard_file, shard_archive in zip(shard_files, shard_archives)]
+    for download_command in download_commands:
         print(f"Executing download command: {' '.join(download_command)}")
-        subprocess.run(download_command, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Warning: yt-dlp exited with an error (code {e.returncode}). This can be normal. Continuing to organization pass.")
-    except Exception as e:
-        print(f"An unexpected error occurred during download: {e}")
+
+    returncodes = []
+    if yt_dlp is not None:
+        # Run yt-dlp in-process, one thread per shard; the per-request sleeps overlap across shards
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(download_commands)) as executor:
+            futures = [executor.submit(run_download_in_process, command) for command in download_commands]
+            for future in futures:
+                try:
+                    returncodes.append(future.result())
+                except Exception as e:
+                    print(f"An unexpected error occurred during download: {e}")
+    else:
+        # Each shard runs in its own yt-dlp process, so the per-request sleeps overlap across shards
+        processes = []
+        for download_command in download_commands:
+            try:
+                processes.append(subprocess.Popen(download_command))
+            except Exception as e:
+                print(f"An unexpected error occurred during download: {e}")
+        returncodes = [process.wait() for process in processes]
+
+    for returncode in returncodes:
+        if returncode != 0:
+            print(f"Warning: yt-dlp exited with an error (code {returncode}). This can be normal. Continuing to organization pass.")
+
+    if shard_files != [batch_file]:
+        merge_shard_archives(archive_path, shard_archives)
+        for shard_file in shard_files:
+            os.remove(shard_file)
 
     print("---" + " Finished Pass 1: Downloading subtitles ---")
 
     # --- Pass 2: Organize subtitles into folders ---
     print("---" + " Starting Pass 2: Organizing subtitles ---")
-    for filename in os.listdir(temp_dir):
-        if filename.endswith('.info.json'):
-            json_path = os.path.join(temp_dir, filename)
-            vtt_filename = filename.replace('.info.json', '.es.vtt')
-            vtt_path = os.path.join(temp_dir, vtt_filename)
-
-            if os.path.exists(vtt_path):
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-
-                # Extract data from metadata
-                upload_date = metadata.get('upload_date', '')
-                video_id = metadata.get('id', '')
-                playlist = metadata.get('playlist', '')
-                uploader_id = metadata.get('uploader_id', '')
-                channel_id = metadata.get('channel_id', '')
-                title = metadata.get('title', '')
-                lang = 'es'
-                ext = 'vtt'
-
-                # Sanitize parts for final filename and folder name
-                playlist_clean = sanitize_filename(playlist)
-                uploader_id_clean = sanitize_filename(uploader_id.replace('@', ''))
-                channel_id_clean = sanitize_filename(channel_id)
-                title_clean = sanitize_filename(title)
-
-                # Construct final clean filename
-                final_filename_parts = [
-                    f"({upload_date})",
-                    f"[{video_id}]",
-                    playlist_clean,
-                    uploader_id_clean,
-                    channel_id_clean,
-                    title_clean,
-                    lang,
-                    'cleaned',
-                    ext
-                ]
-                final_filename = '.'.join(filter(None, final_filename_parts))
-                
-                # Construct final folder name
-                folder_name_parts = [channel_id_clean, uploader_id_clean, playlist_clean]
-                folder_name = '.'.join(filter(None, folder_name_parts))
-                
-                if not folder_name:
-                    print(f"Could not determine a valid directory name for {vtt_filename}. Leaving in temp folder.")
-                    os.remove(json_path) # remove json file
-                    continue
-
-                # Clean the VTT file
-                cleaned_temp_path = vtt_path.replace('.vtt', '.cleaned.vtt')
-                if clean_vtt_file_python(vtt_path, cleaned_temp_path):
-                    os.remove(vtt_path)
-                else:
-                    print(f"Skipping organization for failed-to-clean file: {vtt_filename}")
-                    os.remove(json_path) # remove json file
-                    continue
-
-                # Move and rename the cleaned file
-                channel_dir = os.path.join(output_path, folder_name)
-                os.makedirs(channel_dir, exist_ok=True)
-                dest_path = os.path.join(channel_dir, final_filename)
-
-                print(f"Moving and renaming {cleaned_temp_path} to {dest_path}")
-                try:
-                    shutil.move(cleaned_temp_path, dest_path)
-                    os.remove(json_path) # remove json file
-                except FileNotFoundError:
-                    print(f"Error moving file: {cleaned_temp_path} not found.")
-            else:
-                print(f"VTT file not found for {filename}. Skipping.")
-                os.remove(json_path) # remove json file
+    # Group the temp dir by suffix in one scandir pass: '<id>.info.json' and '<id>.<lang>.vtt'
+    json_paths_by_stem = {}
+    vtt_paths_by_stem = {}
+    with os.scandir(temp_dir) as it:
+        for entry in it:
+            name = entry.name
+            if name.endswith('.info.json'):
+                json_paths_by_stem[name[:-len('.info.json')]] = entry.path
+            elif name.endswith('.vtt') and not name.endswith('.cleaned.vtt'):
+                stem, _, lang = name[:-len('.vtt')].rpartition('.')
+                if stem:
+                    vtt_paths_by_stem.setdefault(stem, {})[lang] = entry.path
+
+    # Prefer languages in the order they were requested; fall back to whatever was downloaded
+    preferred_langs = [lang.strip() for lang in sub_langs.split(',') if lang.strip()]
 
+    # (json_path, vtt_path, lang) triples; each one is independent, so they are cleaned on all cores
+    tasks = []
+    for stem, json_path in json_paths_by_stem.items():
+        vtt_paths = vtt_paths_by_stem.get(stem)
+        if not vtt_paths:
+            print(f"VTT file not found for {os.path.basename(json_path)}. Skipping.")
+            os.remove(json_path) # remove json file
+            continue
+        lang = next((l for l in preferred_langs if l in vtt_paths), None) or min(vtt_paths)
+        tasks.append((json_path, vtt_paths[lang], lang))
+
+    if tasks:
+        json_paths, vtt_paths, langs = zip(*tasks)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=clean_workers) as executor:
+            list(executor.map(organize_subtitle_file, json_paths, vtt_paths, langs,
+                              itertools.repeat(output_path), chunksize=8))
 
     print("---" + " Finished Pass 2: Organizing subtitles ---")
     if os.path.isdir(temp_dir) and not os.listdir(temp_dir):
@@ -230,6 +473,8 @@ if __name__ == '__main__':
     parser.add_argument('--input-file', required=True, help='Path to the input file (.json, .html, or .txt).')
     parser.add_argument('--sub-langs', default='es', help='Subtitle languages (e.g., en,es).')
     parser.add_argument('--output-path', default='subtitles', help='Base directory for subtitles.')
+    parser.add_argument('--download-workers', type=int, default=1, help='Number of yt-dlp processes to split the URL list across.')
+    parser.add_argument('--clean-workers', type=int, default=None, help='Processes used to clean subtitles in Pass 2 (default: number of CPUs).')
 
     args = parser.parse_args()
 
@@ -251,11 +496,20 @@ if __name__ == '__main__':
         print("No YouTube URLs found in the input file.")
         exit(0)
 
+    archive_path = os.path.join(args.output_path, 'ytdl-archive.txt')
+    url_count = len(urls)
+    urls = filter_archived_urls(urls, archive_path)
+    print(f"Skipping {url_count - len(urls)} URLs already in {archive_path}.")
+    if not urls:
+        print("All URLs in the input file are already downloaded.")
+        exit(0)
+
     temp_batch_file = 'temp_urls.txt'
     with open(temp_batch_file, 'w', encoding='utf-8') as f:
         for url in urls:
             f.write(url + '\n')
 
-    download_and_organize_subtitles(temp_batch_file, args.sub_langs, args.output_path)
+    download_and_organize_subtitles(temp_batch_file, args.sub_langs, args.output_path, args.clean_workers,
+                                    args.download_workers)
 
     os.remove(temp_batch_file)
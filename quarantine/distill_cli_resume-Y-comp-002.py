@@ -7,6 +7,7 @@ from pathlib import Path
 import concurrent.futures
 from typing import List, Tuple
 import math
+import bisect
 
 def get_args():
     """Parses and returns command-line arguments."""
@@ -15,12 +16,6 @@ def get_args():
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
 
-    # --- Directory and File Arguments ---
-    parser = argparse.ArgumentParser(
-        description="A script to recursively distill a large number of text files into a single summary using a Gemini LLM. Includes resume capability.",
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter
-    )
-
     # --- Directory and File Arguments ---
     parser.add_argument(
         "-s", "--source-dir",
@@ -97,9 +92,9 @@ def get_args():
 
     return parser.parse_args()
 
-def get_file_size_mb(file_path: Path) -> float:
-    """Get file size in megabytes."""
-    return file_path.stat().st_size / (1024 * 1024)
+def get_size_bytes(file_path: Path) -> int:
+    """Get file size in bytes; sizes stay integers and are only shown in MB."""
+    return file_path.stat().st_size
 
 def create_batches(file_list: List[Path], batch_size: int, size_based: bool = False, max_batch_size_mb: float = 10.0) -> List[List[Path]]:
     """
@@ -113,62 +108,33 @@ def create_batches(file_list: List[Path], batch_size: int, size_based: bool = Fa
         # Original simple batching by count
         return [file_list[i:i + batch_size] for i in range(0, len(file_list), batch_size)]
     
-    # Size-based batching using First Fit Decreasing algorithm [[5]]
+    # Size-based batching using Best Fit Decreasing: each file goes into the batch with the
+    # least room left that still fits it, so no compaction pass is needed afterwards.
     # Sort files by size descending to place larger files first
-    files_with_sizes = [(f, get_file_size_mb(f)) for f in file_list]
+    files_with_sizes = [(f, get_size_bytes(f)) for f in file_list]
     files_with_sizes.sort(key=lambda x: x[1], reverse=True)
+    max_bytes = int(max_batch_size_mb * 1024 * 1024)
     
     batches = []
-    batch_sizes = []  # Track current size of each batch
+    free_space = []  # (remaining_bytes, batch_index), kept sorted for bisect lookups
     
     for file_path, file_size in files_with_sizes:
-        # Skip files larger than max_batch_size_mb
-        if file_size > max_batch_size_mb:
-            print(f"Warning: File {file_path} is larger than max batch size ({file_size:.2f} MB > {max_batch_size_mb} MB). Processing individually.")
+        # Skip files larger than the batch limit
+        if file_size > max_bytes:
+            print(f"Warning: File {file_path} is larger than max batch size ({file_size / 1048576:.2f} MB > {max_batch_size_mb} MB). Processing individually.")
             batches.append([file_path])
-            batch_sizes.append(file_size)
             continue
             
-        # Try to fit file in existing batch
-        placed = False
-        for i, batch in enumerate(batches):
-            if batch_sizes[i] + file_size <= max_batch_size_mb:
-                batch.append(file_path)
-                batch_sizes[i] += file_size
-                placed = True
-                break
-        
-        # If file didn't fit in any existing batch, create new batch
-        if not placed:
+        # Find the tightest batch that still has room for this file
+        i = bisect.bisect_left(free_space, (file_size, -1))
+        if i < len(free_space):
+            remaining, batch_index = free_space.pop(i)
+            batches[batch_index].append(file_path)
+            bisect.insort(free_space, (remaining - file_size, batch_index))
+        else:
+            # If file didn't fit in any existing batch, create new batch
+            bisect.insort(free_space, (max_bytes - file_size, len(batches)))
             batches.append([file_path])
-            batch_sizes.append(file_size)
-    
-    # Further optimize by trying to fill smaller batches with tiny files
-    # This is a simplified version of bin compaction [[4]]
-    for i in range(len(batches) - 1, 0, -1):  # Iterate backwards
-        if len(batches[i]) == 1 and get_file_size_mb(batches[i][0]) > max_batch_size_mb * 0.8:
-            # Keep large single-file batches as they are
-            continue
-            
-        # Try to move files from this batch to earlier batches
-        files_to_move = []
-        for j, file_path in enumerate(batches[i]):
-            file_size = get_file_size_mb(file_path)
-            for k in range(i):  # Check all previous batches
-                if batch_sizes[k] + file_size <= max_batch_size_mb:
-                    batches[k].append(file_path)
-                    batch_sizes[k] += file_size
-                    files_to_move.append(j)
-                    break
-        
-        # Remove moved files (in reverse order to maintain indices)
-        for j in reversed(files_to_move):
-            batches[i].pop(j)
-        
-        # Remove batch if it became empty
-        if not batches[i]:
-            batches.pop(i)
-            batch_sizes.pop(i)
     
     return batches
 
@@ -179,8 +145,8 @@ def _process_single_batch(batch: List[Path], round_number: int, batch_number: in
     print(f"  -> Processing Batch {batch_number} (Round {round_number})...")
     
     # Calculate total size of this batch
-    total_size_mb = sum(get_file_size_mb(f) for f in batch)
-    print(f"     Batch contains {len(batch)} files, total size: {total_size_mb:.2f} MB")
+    total_size = sum(get_size_bytes(f) for f in batch)
+    print(f"     Batch contains {len(batch)} files, total size: {total_size / 1048576:.2f} MB")
 
     # <<< FIX: No longer need relative_to() as we now pass absolute paths directly.
     # This is more robust for subprocess calls.
@@ -231,7 +197,7 @@ def run_distillation_round(input_files: List[Path], round_number: int, output_pa
     
     print(f"Divided into {len(batches)} batches.")
     if size_based_batching:
-        batch_info = [f"{len(b)} files, {sum(get_file_size_mb(f) for f in b):.2f} MB" for b in batches]
+        batch_info = [f"{len(b)} files, {sum(get_size_bytes(f) for f in b) / 1048576:.2f} MB" for b in batches]
         print(f"Batch details: {', '.join(batch_info)}")
 
     output_files = []
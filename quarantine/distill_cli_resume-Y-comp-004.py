@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 import os
+import re
 import subprocess
 import shutil
+import threading
 import argparse
 from pathlib import Path
 import concurrent.futures
-from typing import List
+import heapq
+from typing import Dict, List, Optional, Tuple
 
 def get_args():
     """Parses and returns command-line arguments."""
@@ -83,13 +86,44 @@ def get_args():
 
     return parser.parse_args()
 
+def walk_files_with_sizes(root: Path, extension: str, exclude_dir: Optional[Path] = None) -> List[Tuple[Path, int]]:
+    """Lists (path, size) pairs of the extension files under root, leaving out exclude_dir."""
+    found: List[Tuple[Path, int]] = []
+    excluded = str(exclude_dir) if exclude_dir else None
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except OSError as e:
+            # Locked or vanished directories are passed over
+            print(f"[WARNING] Skipping unreadable directory {directory}: {e}")
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path == excluded:
+                        continue
+                    stack.append(entry.path)
+                elif entry.name.endswith(extension) and entry.is_file():
+                    found.append((Path(entry.path), entry.stat().st_size))
+    return found
+
+def get_file_size(path: Path, file_sizes: Dict[Path, int]) -> int:
+    """Returns path's size, memoized in file_sizes."""
+    size = file_sizes.get(path)
+    if size is None:
+        size = file_sizes[path] = path.stat().st_size
+    return size
+
 def create_batches_by_count(file_list: List[Path], batch_size: int) -> List[List[Path]]:
     """Splits files into batches by count (old behavior)."""
     if not file_list:
         return []
     return [file_list[i:i + batch_size] for i in range(0, len(file_list), batch_size)]
 
-def create_batches_by_size(file_list: List[Path], target_batch_size: int) -> List[List[Path]]:
+def create_batches_by_size(file_list: List[Path], target_batch_size: int,
+                           file_sizes: Optional[Dict[Path, int]] = None) -> List[List[Path]]:
     """
     Create batches of files based on total byte size.
     - Large files go alone.
@@ -98,7 +132,9 @@ def create_batches_by_size(file_list: List[Path], target_batch_size: int) -> Lis
     if not file_list:
         return []
 
-    files_with_sizes = [(f, f.stat().st_size) for f in file_list]
+    if file_sizes is None:
+        file_sizes = {}
+    files_with_sizes = [(f, get_file_size(f, file_sizes)) for f in file_list]
     files_with_sizes.sort(key=lambda x: x[1], reverse=True)  # biggest first
 
     batches = []
@@ -125,34 +161,93 @@ def create_batches_by_size(file_list: List[Path], target_batch_size: int) -> Lis
 
     return batches
 
-def create_batches(file_list: List[Path], batch_size: int, batch_mode: str) -> List[List[Path]]:
+def create_batches(file_list: List[Path], batch_size: int, batch_mode: str,
+                   file_sizes: Optional[Dict[Path, int]] = None) -> List[List[Path]]:
     """Dispatch to batching strategy based on mode."""
     if batch_mode == "size":
-        return create_batches_by_size(file_list, batch_size)
+        return create_batches_by_size(file_list, batch_size, file_sizes)
     else:
         return create_batches_by_count(file_list, batch_size)
 
+# A last batch filled beyond this share of its budget is split across the workers instead
+FINAL_SPLIT_THRESHOLD = 0.7
+
+def final_split_parts(file_list: List[Path], batch_size: int, batch_mode: str, max_workers: int,
+                      file_sizes: Dict[Path, int]) -> int:
+    """
+    Returns how many parallel batches to split a round into when it would otherwise be one
+    nearly full final batch (0 to batch normally). One long call on the critical path
+    becomes several shorter parallel ones plus a small extra reduction.
+    """
+    if batch_mode == "size":
+        load = sum(get_file_size(p, file_sizes) for p in file_list)
+    else:
+        load = len(file_list)
+    if not FINAL_SPLIT_THRESHOLD * batch_size < load <= batch_size:
+        return 0
+    parts = min(max_workers, len(file_list) // 2)
+    return parts if parts >= 2 else 0
+
+def create_final_balanced_split(file_list: List[Path], parts: int,
+                                file_sizes: Dict[Path, int]) -> List[List[Path]]:
+    """
+    Splits files into `parts` batches of near-equal total size (largest file to the lightest batch).
+    Each batch keeps the files in their original order.
+    """
+    order = {p: i for i, p in enumerate(file_list)}
+    bins = [(0, i, []) for i in range(parts)]
+    for path in sorted(file_list, key=lambda p: get_file_size(p, file_sizes), reverse=True):
+        total, i, paths = bins[0]
+        paths.append(path)
+        heapq.heapreplace(bins, (total + get_file_size(path, file_sizes), i, paths))
+    batches = [sorted(paths, key=order.get) for _, _, paths in bins if paths]
+    return sorted(batches, key=lambda b: order[b[0]])
+
+def _file_reference(path: Path) -> str:
+    """@reference for path in gemini-cli syntax (spaces backslash-escaped)."""
+    return "@" + str(path).replace(" ", "\\ ")
+
+# Per-argument limit on Linux (32 pages), checked together with ARG_MAX
+MAX_ARG_STRLEN = 32 * 4096
+
+def _fits_in_argv(argument: str) -> bool:
+    """True if argument is short enough for one argv string."""
+    limit = MAX_ARG_STRLEN
+    try:
+        limit = min(limit, os.sysconf("SC_ARG_MAX"))
+    except (AttributeError, ValueError, OSError):
+        pass
+    return len(argument.encode("utf-8")) < limit
+
 def _process_single_batch(batch: List[Path], round_number: int, batch_number: int,
-                          output_dir: Path, model: str, prompt: str, timeout: int):
+                          output_dir: Path, model: str, prompt: str, prompt_reference: str, timeout: int):
     """Process a single batch in a separate thread."""
     print(f"  -> Processing Batch {batch_number} (Round {round_number})...")
-    file_references = " ".join([f"'@{str(file_path)}'" for file_path in batch])
+    file_references = " ".join([_file_reference(file_path) for file_path in batch])
     full_prompt = f"{prompt} {file_references}"
-    command_str = f"gemini -m {model} -y -p \"{full_prompt}\""
+    if not _fits_in_argv(full_prompt):
+        # Too long with the prompt text inline; pass the prompt file by reference instead
+        full_prompt = f"{prompt_reference} {file_references}"
+    # An argument list runs gemini without a /bin/sh in between, so quotes in paths or the prompt are harmless
+    command = ["gemini", "-m", model, "-y", "-p", full_prompt]
+
+    output_filename = output_dir / f"round_{round_number}_batch_{batch_number}.txt"
+    # stdout goes straight to a temp file (no copy in Python); it is renamed only on success
+    temp_filename = output_filename.with_name(output_filename.name + ".tmp")
 
     try:
-        result = subprocess.run(
-            command_str,
-            shell=True,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8',
-            timeout=timeout
-        )
-        output_filename = output_dir / f"round_{round_number}_batch_{batch_number}.txt"
-        with open(output_filename, "w", encoding='utf-8') as f:
-            f.write(result.stdout)
+        with open(temp_filename, "wb") as out_file:
+            subprocess.run(
+                command,
+                shell=False,
+                stdout=out_file,
+                stderr=subprocess.PIPE,
+                check=True,
+                encoding='utf-8',
+                errors='replace',
+                timeout=timeout
+            )
+        os.replace(temp_filename, output_filename)
         print(f"     Success! Saved distilled output to: {output_filename.name}")
         return output_filename
     except FileNotFoundError:
@@ -168,16 +263,33 @@ def _process_single_batch(batch: List[Path], round_number: int, batch_number: in
     except Exception as e:
         print(f"[ERROR] Unexpected error in Batch {batch_number}: {e}")
         raise
+    finally:
+        temp_filename.unlink(missing_ok=True)
+
+_OUTPUT_NAME_RE = re.compile(r"round_(\d+)_batch_(\d+)\.txt")
+
+def _output_order(path: Path) -> Tuple[int, int]:
+    """Sort key (round, batch) for round_N_batch_M.txt outputs."""
+    match = _OUTPUT_NAME_RE.match(path.name)
+    return int(match[1]), int(match[2])
 
 def run_distillation_round(input_files: List[Path], round_number: int, output_path: Path,
                            batch_size: int, batch_mode: str, max_workers: int,
-                           model: str, prompt: str, timeout: int, resume: bool) -> List[Path] or None:
-    """Run one round of distillation in batches."""
+                           model: str, prompt: str, prompt_reference: str, timeout: int, resume: bool,
+                           file_sizes: Optional[Dict[Path, int]] = None,
+                           split_into: int = 0) -> List[Path] or None:
+    """Run one round of distillation in batches (or in `split_into` balanced batches, when set)."""
     print(f"\n--- Starting Round {round_number} ---")
     print(f"Processing {len(input_files)} files in this round.")
 
-    batches = create_batches(input_files, batch_size, batch_mode)
-    print(f"Divided into {len(batches)} batches (mode={batch_mode}, size={batch_size}).")
+    if file_sizes is None:
+        file_sizes = {}
+    if split_into:
+        batches = create_final_balanced_split(input_files, split_into, file_sizes)
+        print(f"Split the nearly full final batch into {len(batches)} parallel batches.")
+    else:
+        batches = create_batches(input_files, batch_size, batch_mode, file_sizes)
+        print(f"Divided into {len(batches)} batches (mode={batch_mode}, size={batch_size}).")
 
     output_files = []
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
@@ -191,7 +303,7 @@ def run_distillation_round(input_files: List[Path], round_number: int, output_pa
                 continue
             future = executor.submit(_process_single_batch,
                                      batch, round_number, batch_number,
-                                     output_path, model, prompt, timeout)
+                                     output_path, model, prompt, prompt_reference, timeout)
             future_to_batch_number[future] = batch_number
 
         for future in concurrent.futures.as_completed(future_to_batch_number):
@@ -205,7 +317,7 @@ def run_distillation_round(input_files: List[Path], round_number: int, output_pa
                 executor.shutdown(wait=False, cancel_futures=True)
                 return None
 
-    return sorted(output_files, key=lambda p: p.name)
+    return sorted(output_files, key=_output_order)
 
 def main():
     args = get_args()
@@ -230,22 +342,32 @@ def main():
         print(f"[ERROR] Prompt file not found: {prompt_file_path}")
         return
     try:
-        with open(prompt_file_path, "r", encoding="utf-8") as f:
-            prompt = f.read()
+        prompt = prompt_file_path.read_text(encoding="utf-8")
     except Exception as e:
         print(f"[ERROR] Could not read prompt file: {e}")
         return
+    prompt_reference = _file_reference(prompt_file_path)
+    if not _fits_in_argv(prompt):
+        # Fail over before the first batch rather than at it: gemini reads the prompt file itself
+        print("[INFO] Prompt too large for the command line; passing it to gemini as an @reference instead.")
+        prompt = prompt_reference
 
+    trash_path = None
     if args.resume:
         print(f"Resume mode enabled. Using existing output directory: {output_path}")
         os.makedirs(output_path, exist_ok=True)
     else:
         if output_path.exists():
             print(f"Clearing output directory: {output_path}")
-            shutil.rmtree(output_path)
+            # Renaming is instant; the old run's files are deleted in the background while round 1 runs
+            trash_path = output_path.with_name(f"{output_path.name}.trash.{os.getpid()}")
+            os.rename(output_path, trash_path)
+            threading.Thread(target=shutil.rmtree, args=(trash_path,), kwargs={"ignore_errors": True}).start()
         os.makedirs(output_path)
 
-    initial_files = sorted([p for p in source_path.glob(f"**/*{args.extension}")])
+    # One scandir walk finds the files and their sizes; batching never stat()s them again
+    file_sizes = dict(walk_files_with_sizes(source_path, args.extension, trash_path))
+    initial_files = sorted(file_sizes)
     if not initial_files:
         print(f"[ERROR] No files with extension '{args.extension}' found in {source_path}")
         return
@@ -253,12 +375,19 @@ def main():
     print(f"Found {len(initial_files)} source files.")
     current_files = initial_files
     round_count = 1
+    final_split_done = False
 
     while len(current_files) > 1:
+        # Split the last hop at most once, so the extra reduction can't trigger another split
+        split_into = 0
+        if not final_split_done:
+            split_into = final_split_parts(current_files, args.batch_size, args.batch_mode,
+                                           args.max_workers, file_sizes)
+            final_split_done = split_into > 0
         distilled_files = run_distillation_round(
             current_files, round_count, output_path,
             args.batch_size, args.batch_mode, args.max_workers,
-            args.model, prompt, args.timeout, args.resume
+            args.model, prompt, prompt_reference, args.timeout, args.resume, file_sizes, split_into
         )
         if distilled_files is None:
             print("Aborting due to error. Use --resume to continue.")
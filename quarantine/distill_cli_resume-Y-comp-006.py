@@ -1,38 +1,30 @@
 import heapq
-from typing import List, Tuple
+import re
+import itertools
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
-# ---------- NEW HELPER -------------------------------------------------
-class _Bin:
-    """Helper for the bin-packing algorithm."""
-    __slots__ = ("paths", "size")
-
-    def __init__(self) -> None:
-        self.paths: List[Path] = []
-        self.size: int = 0
-
-    # Make the bin comparable by size so heapq can always give us the smallest
-    def __lt__(self, other: "_Bin") -> bool:
-        return self.size < other.size
-
-
 def create_size_balanced_batches(
     file_list: List[Path],
     *,
     max_files_per_batch: int,
     max_batches: int = None,
+    file_sizes: Optional[Dict[Path, int]] = None,
 ) -> List[List[Path]]:
     """
     Split *file_list* into at most *max_batches* batches whose **total byte size**
     is as even as possible.  No batch will contain more than *max_files_per_batch*
-    individual files.
+    individual files.  Sizes already in *file_sizes* (e.g. from an os.scandir walk of
+    the sources) are used without another stat() call.
     """
     if not file_list:
         return []
 
     # Build (size, path) pairs and sort DESCENDING (largest first)
+    if file_sizes is None:
+        file_sizes = {}
     sized_files: List[Tuple[int, Path]] = [
-        (p.stat().st_size, p) for p in file_list
+        (file_sizes[p] if p in file_sizes else p.stat().st_size, p) for p in file_list
     ]
     sized_files.sort(reverse=True, key=lambda t: t[0])
 
@@ -40,28 +32,36 @@ def create_size_balanced_batches(
         max_batches = max(1, (len(file_list) + max_files_per_batch - 1) // max_files_per_batch)
 
     # ---------- Worst-fit decreasing ----------
-    bins: List[_Bin] = [_Bin() for _ in range(max_batches)]
-    heapq.heapify(bins)
+    # Heap entries are (total_size, seq, paths): tuples compare in C, and the unique seq
+    # breaks size ties so the path lists themselves are never compared
+    seq = itertools.count()
+    bins: List[Tuple[int, int, List[Path]]] = [(0, next(seq), []) for _ in range(max_batches)]
+    full_bins: List[List[Path]] = []
 
     for size, path in sized_files:
-        # Pick the bin that currently has the smallest total size
-        smallest_bin = heapq.heappop(bins)
-
-        # Respect the hard file-count limit
-        if len(smallest_bin.paths) >= max_files_per_batch:
-            # All bins are full by *count*; open a new one
-            new_bin = _Bin()
-            new_bin.paths.append(path)
-            new_bin.size = size
-            heapq.heappush(bins, new_bin)
+        # Respect the hard file-count limit: a full bin can take nothing more, set it aside
+        while bins and len(bins[0][2]) >= max_files_per_batch:
+            full_bins.append(heapq.heappop(bins)[2])
+
+        if bins:
+            # Put the file in the bin that currently has the smallest total size
+            bin_size, _, paths = bins[0]
+            paths.append(path)
+            heapq.heapreplace(bins, (bin_size + size, next(seq), paths))
         else:
-            smallest_bin.paths.append(path)
-            smallest_bin.size += size
-            heapq.heappush(bins, smallest_bin)
+            # All bins are full by *count*; open a new one
+            heapq.heappush(bins, (size, next(seq), [path]))
 
     # Return non-empty bins only
-    return [b.paths for b in bins if b.paths]
+    return [paths for paths in full_bins + [b[2] for b in bins] if paths]
+
+
+_OUTPUT_NAME_RE = re.compile(r"round_(\d+)_batch_(\d+)\.txt")
 
+def _output_order(path: Path) -> Tuple[int, int]:
+    """Orders round outputs numerically by round, then batch."""
+    match = _OUTPUT_NAME_RE.match(path.name)
+    return int(match[1]), int(match[2])
 
 # ---------- PATCHED `run_distillation_round` -----------------------------
 def run_distillation_round(
@@ -127,4 +127,4 @@ def run_distillation_round(
                 executor.shutdown(wait=False, cancel_futures=True)
                 return None
 
-    return sorted(output_files, key=lambda p: p.name)
+    return sorted(output_files, key=_output_order)
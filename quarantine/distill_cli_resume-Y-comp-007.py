@@ -1,11 +1,23 @@
 #!/usr/bin/env python3
 import os
+import re
 import subprocess
 import shutil
+import threading
+import logging
+import logging.handlers
+import queue
+import sys
+import json
+import hashlib
 import argparse
 from pathlib import Path
-import concurrent.futures
-from typing import List, Tuple
+from dataclasses import dataclass
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("distill")
 
 def get_args():
     """Parses and returns command-line arguments."""
@@ -47,6 +59,11 @@ def get_args():
         default="prompt.txt",
         help="Path to a text file containing the prompt for the LLM."
     )
+    parser.add_argument(
+        "--prompt-by-reference",
+        action="store_true",
+        help="Pass the prompt file to gemini as an @reference instead of sending its text with every batch."
+    )
 
     # --- Concurrency and Batching Arguments ---
     # <<< CHANGED: Replaced --batch-size with size-based arguments >>>
@@ -62,11 +79,29 @@ def get_args():
         default=10000,
         help="Files larger than this size (in Kilobytes) will be processed in their own dedicated batch."
     )
+    parser.add_argument(
+        "--target-batch-latency-s",
+        type=float,
+        default=None,
+        help="If set, the max batch size is re-tuned every round from measured gemini throughput so a batch takes about this many seconds."
+    )
+    parser.add_argument(
+        "--batch-size-kb-min",
+        type=int,
+        default=500,
+        help="Lower bound (in Kilobytes) for the adaptive max batch size."
+    )
+    parser.add_argument(
+        "--batch-size-kb-max",
+        type=int,
+        default=60000,
+        help="Upper bound (in Kilobytes) for the adaptive max batch size."
+    )
     parser.add_argument(
         "-w", "--max-workers",
         type=int,
         default=3,
-        help="Max number of concurrent workers (threads) for processing batches."
+        help="Max number of gemini-cli processes running at the same time."
     )
     parser.add_argument(
         "-t", "--timeout",
@@ -84,11 +119,57 @@ def get_args():
 
     return parser.parse_args()
 
+def walk_files_with_sizes(root: Path, extension: str, exclude_dir: Optional[Path] = None) -> List[Tuple[Path, int]]:
+    """Recursively finds the extension files under root (except inside exclude_dir) along with their sizes."""
+    found: List[Tuple[Path, int]] = []
+    excluded = str(exclude_dir) if exclude_dir else None
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except OSError as e:
+            # Keep walking past directories that cannot be listed
+            logger.warning("[WARNING] Skipping unreadable directory %s: %s", directory, e)
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path == excluded:
+                        continue
+                    stack.append(entry.path)
+                elif entry.name.endswith(extension) and entry.is_file():
+                    found.append((Path(entry.path), entry.stat().st_size))
+    return found
+
+def get_file_size(path: Path, file_sizes: Dict[Path, int]) -> int:
+    """Looks up path's size in file_sizes, stat()ing it on a miss."""
+    size = file_sizes.get(path)
+    if size is None:
+        size = file_sizes[path] = path.stat().st_size
+    return size
+
+@dataclass(frozen=True, slots=True)
+class RunConfig:
+    """The settings the distillation rounds need, frozen once the prompt has been read."""
+    model: str
+    prompt: str
+    prompt_reference: str
+    timeout: int
+    max_workers: int
+    resume: bool
+    max_batch_size_kb: int
+    large_file_threshold_kb: int
+    target_batch_latency_s: Optional[float]
+    batch_size_kb_min: int
+    batch_size_kb_max: int
+
 # <<< NEW FUNCTION: The core of the size-based batching logic >>>
 def create_batches_by_size(
     file_list: List[Path], 
     max_batch_size_kb: int, 
-    large_file_threshold_kb: int
+    large_file_threshold_kb: int,
+    file_sizes: Optional[Dict[Path, int]] = None
 ) -> List[List[Path]]:
     """
     Splits a list of files into batches based on their total size.
@@ -105,14 +186,16 @@ def create_batches_by_size(
 
     max_size_bytes = max_batch_size_kb * 1024
     large_file_bytes = large_file_threshold_kb * 1024
+    if file_sizes is None:
+        file_sizes = {}
 
     try:
-        # Create a list of tuples: (Path, size_in_bytes)
+        # Create a list of tuples: (Path, size_in_bytes); sizes found by the source scan are reused
         files_with_sizes: List[Tuple[Path, int]] = [
-            (p, p.stat().st_size) for p in file_list
+            (p, get_file_size(p, file_sizes)) for p in file_list
         ]
     except FileNotFoundError as e:
-        print(f"[ERROR] A file could not be found during batch creation: {e}")
+        logger.error("[ERROR] A file could not be found during batch creation: %s", e)
         # Depending on desired robustness, you might want to filter out the missing file
         # or just raise the error. For now, we'll raise.
         raise
@@ -121,34 +204,30 @@ def create_batches_by_size(
     files_with_sizes.sort(key=lambda x: x[1], reverse=True)
 
     all_batches: List[List[Path]] = []
-    files_to_pack: List[Tuple[Path, int]] = []
+    current_batch: List[Path] = []
+    current_batch_size = 0
 
-    # First, isolate the very large files into their own batches
+    # One pass: the list is sorted largest first, so the very large files all come first and
+    # go into their own batches; everything after them is packed greedily
     for path, size in files_with_sizes:
         if size >= large_file_bytes:
-            print(f"  -> Isolating large file into its own batch: {path.name} ({size / 1024:.2f} KB)")
+            logger.info("  -> Isolating large file into its own batch: %s (%.2f KB)", path.name, size / 1024)
             all_batches.append([path])
-        else:
-            files_to_pack.append((path, size))
-            
-    # Now, pack the rest using a greedy algorithm
-    if files_to_pack:
-        current_batch: List[Path] = []
-        current_batch_size = 0
-        for path, size in files_to_pack:
-            # This check also handles files that are larger than max_batch_size_kb
-            # but smaller than large_file_threshold_kb. They will go into their own batch.
-            if current_batch and current_batch_size + size > max_size_bytes:
-                all_batches.append(current_batch)
-                current_batch = []
-                current_batch_size = 0
-            
-            current_batch.append(path)
-            current_batch_size += size
-        
-        # Don't forget the last batch
-        if current_batch:
+            continue
+
+        # This check also handles files that are larger than max_batch_size_kb
+        # but smaller than large_file_threshold_kb. They will go into their own batch.
+        if current_batch and current_batch_size + size > max_size_bytes:
             all_batches.append(current_batch)
+            current_batch = []
+            current_batch_size = 0
+
+        current_batch.append(path)
+        current_batch_size += size
+
+    # Don't forget the last batch
+    if current_batch:
+        all_batches.append(current_batch)
 
     return all_batches
 
@@ -159,122 +238,317 @@ def create_batches_by_size(
 #         return []
 #     return [file_list[i:i + batch_size] for i in range(0, len(file_list), batch_size)]
 
-def _process_single_batch(batch: List[Path], round_number: int, batch_number: int, output_dir: Path, model: str, prompt: str, timeout: int):
+def _file_reference(path: Path) -> str:
+    """Formats path as a gemini-cli @reference, escaping spaces."""
+    return "@" + str(path).replace(" ", "\\ ")
+
+# Linux caps each argv string at MAX_ARG_STRLEN (32 pages) on top of the ARG_MAX total
+MAX_ARG_STRLEN = 32 * 4096
+
+def _fits_in_argv(argument: str) -> bool:
+    """Whether argument can be passed to gemini as a single argv string."""
+    limit = MAX_ARG_STRLEN
+    try:
+        limit = min(limit, os.sysconf("SC_ARG_MAX"))
+    except (AttributeError, ValueError, OSError):
+        pass
+    return len(argument.encode("utf-8")) < limit
+
+# One JSON line per finished batch: {round, batch, inputs: {path: sha256}, output, sha256, elapsed}
+MANIFEST_NAME = "manifest.jsonl"
+
+def _file_sha256(path: Path) -> str:
+    """Returns the hex SHA-256 of a file, read in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _batch_inputs_key(batch: List[Path]) -> frozenset:
+    """
+    Identifies a batch by its input paths *and* their contents, since round 2+ inputs
+    (round_N_batch_M.txt) keep their names but change content between runs.
+    """
+    return frozenset((str(p), _file_sha256(p)) for p in batch)
+
+def load_manifest(output_dir: Path) -> Dict[frozenset, Tuple[Path, str]]:
+    """Maps the inputs key of every recorded batch to its (output path, sha256); later records win."""
+    manifest: Dict[frozenset, Tuple[Path, str]] = {}
+    try:
+        f = open(output_dir / MANIFEST_NAME, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return manifest
+    with f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted run
+                continue
+            manifest[frozenset(record["inputs"].items())] = (Path(record["output"]), record["sha256"])
+    return manifest
+
+def _recorded_output(manifest: Dict[frozenset, Tuple[Path, str]], batch: List[Path]) -> Path or None:
+    """
+    Returns the output an earlier run produced from exactly these inputs (same paths,
+    same contents), or None if there is none or it has changed since it was recorded.
     """
-    Helper function to process a single batch. This will be run in a separate thread.
+    entry = manifest.get(_batch_inputs_key(batch))
+    if entry is None:
+        return None
+    recorded_output, sha256 = entry
+    try:
+        if _file_sha256(recorded_output) != sha256:
+            return None
+    except OSError:
+        return None
+    return recorded_output
+
+def _reuse_output(recorded_output: Path, expected_output: Path) -> bool:
+    """Puts a recorded output in place as expected_output, replacing whatever stale file is there."""
+    temp_filename = expected_output.with_name(expected_output.name + ".tmp")
+    try:
+        try:
+            os.link(recorded_output, temp_filename)
+        except OSError:
+            shutil.copyfile(recorded_output, temp_filename)
+        os.replace(temp_filename, expected_output)
+    except OSError:
+        temp_filename.unlink(missing_ok=True)
+        return False
+    return True
+
+async def _process_single_batch(batch: List[Path], batch_bytes: int, round_number: int, batch_number: int, output_dir: Path, model: str, prompt: str, prompt_reference: str, timeout: int):
     """
-    batch_size_kb = sum(p.stat().st_size for p in batch) / 1024
-    print(f"  -> Processing Batch {batch_number} (Round {round_number}) - {len(batch)} files, {batch_size_kb:.2f} KB...")
+    Coroutine that processes a single batch with one gemini-cli child process.
+    """
+    batch_size_kb = batch_bytes / 1024
+    logger.info("  -> Processing Batch %s (Round %s) - %s files, %.2f KB...", batch_number, round_number, len(batch), batch_size_kb)
 
-    file_references = " ".join([f"'@{str(file_path)}'" for file_path in batch])
+    file_references = " ".join(_file_reference(file_path) for file_path in batch)
     full_prompt = f"{prompt} {file_references}"
+    if not _fits_in_argv(full_prompt):
+        # No room for the prompt text next to this batch's @references; gemini reads the prompt file itself
+        full_prompt = f"{prompt_reference} {file_references}"
     
-    # Using a list for command arguments is safer than a single string with shell=True
-    # but gemini-cli's @-file syntax works more reliably with shell=True.
-    # We will keep shell=True but be mindful of the input.
-    command_str = f"gemini -m {model} -y -p \"{full_prompt}\""
+    # gemini is exec'd directly with an argument list: no /bin/sh in between and no shell quoting
+    command = ["gemini", "-m", model, "-y", "-p", full_prompt]
+
+    output_filename = output_dir / f"round_{round_number}_batch_{batch_number}.txt"
+    # gemini writes straight into a temp file that only gets the final name on success,
+    # so --resume never mistakes a partial response for a finished batch
+    temp_filename = output_filename.with_name(output_filename.name + ".tmp")
 
     try:
-        result = subprocess.run(
-            command_str,
-            shell=True,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8',
-            timeout=timeout
-        )
-        output_filename = output_dir / f"round_{round_number}_batch_{batch_number}.txt"
-        with open(output_filename, "w", encoding='utf-8') as f:
-            f.write(result.stdout)
-        print(f"     Success! Saved distilled output to: {output_filename.name}")
+        start = time.monotonic()
+        with open(temp_filename, "wb") as output_file:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=output_file,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise subprocess.TimeoutExpired(command, timeout) from None
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(
+                process.returncode, command, None, stderr.decode('utf-8', errors='replace')
+            )
+
+        os.replace(temp_filename, output_filename)
+        # Recorded per batch so a later --resume can reuse it even if the batches come out differently
+        record = {
+            "round": round_number,
+            "batch": batch_number,
+            "inputs": dict(_batch_inputs_key(batch)),
+            "output": str(output_filename),
+            "sha256": _file_sha256(output_filename),
+            "elapsed": round(time.monotonic() - start, 3),
+        }
+        with open(output_dir / MANIFEST_NAME, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        logger.info("     Success! Saved distilled output to: %s", output_filename.name)
         return output_filename
     except FileNotFoundError:
-        print(f"\n[ERROR] 'gemini' command not found. Please ensure gemini-cli is installed and in your PATH.")
+        logger.error("\n[ERROR] 'gemini' command not found. Please ensure gemini-cli is installed and in your PATH.")
         raise
     except subprocess.TimeoutExpired:
-        print(f"\n[ERROR] Command timed out for Batch {batch_number} after {timeout} seconds.")
+        logger.error("\n[ERROR] Command timed out for Batch %s after %s seconds.", batch_number, timeout)
         raise
     except subprocess.CalledProcessError as e:
-        print(f"\n[ERROR] An error occurred while running gemini-cli for Batch {batch_number}.")
-        print(f"  Exit Code: {e.returncode}")
-        print(f"  Stderr: {e.stderr}")
+        logger.error("\n[ERROR] An error occurred while running gemini-cli for Batch %s.", batch_number)
+        logger.error("  Exit Code: %s", e.returncode)
+        logger.error("  Stderr: %s", e.stderr)
         raise
     except Exception as e:
-        print(f"\n[ERROR] An unexpected error occurred for Batch {batch_number}: {e}")
+        logger.error("\n[ERROR] An unexpected error occurred for Batch %s: %s", batch_number, e)
         raise
+    finally:
+        temp_filename.unlink(missing_ok=True)
 
-# <<< MODIFIED: Updated function signature to accept `args` object for batching params >>>
-def run_distillation_round(
+class _AdaptiveBatchSize:
+    """
+    Picks max_batch_size_kb for each round. With --target-batch-latency-s set, it keeps an
+    exponentially weighted average of gemini throughput (bytes per second of batch wall time)
+    and sizes the next round so one batch takes about the target time.
+    The size chosen for each round is appended to .adaptive_batch_kb in the output folder,
+    so --resume rebuilds exactly the same batches.
+    """
+
+    SMOOTHING = 0.3
+
+    def __init__(self, cfg: RunConfig, output_path: Path) -> None:
+        self.max_batch_size_kb = cfg.max_batch_size_kb
+        self.target_latency_s = cfg.target_batch_latency_s
+        self.min_kb = cfg.batch_size_kb_min
+        self.max_kb = cfg.batch_size_kb_max
+        self.throughput: Optional[float] = None
+        self.log_path = output_path / ".adaptive_batch_kb"
+        self.chosen: Dict[int, int] = {}
+        if cfg.resume and self.target_latency_s is not None and self.log_path.exists():
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    round_number, kb = line.split()
+                    self.chosen[int(round_number)] = int(kb)
+
+    def record(self, batch_bytes: int, elapsed: float) -> None:
+        if elapsed <= 0:
+            return
+        sample = batch_bytes / elapsed
+        if self.throughput is None:
+            self.throughput = sample
+        else:
+            self.throughput += self.SMOOTHING * (sample - self.throughput)
+
+    def for_round(self, round_number: int) -> int:
+        if self.target_latency_s is None:
+            return self.max_batch_size_kb
+        if round_number not in self.chosen:
+            if self.throughput is not None:
+                kb = int(self.throughput * self.target_latency_s / 1024)
+                self.max_batch_size_kb = max(self.min_kb, min(self.max_kb, kb))
+            self.chosen[round_number] = self.max_batch_size_kb
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(f"{round_number} {self.max_batch_size_kb}\n")
+        self.max_batch_size_kb = self.chosen[round_number]
+        return self.max_batch_size_kb
+
+async def _timed_batch(sizer: _AdaptiveBatchSize, batch: List[Path], batch_bytes: int, *batch_args):
+    """Runs _process_single_batch and reports the batch's bytes and wall time to sizer."""
+    start = time.monotonic()
+    output_filename = await _process_single_batch(batch, batch_bytes, *batch_args)
+    sizer.record(batch_bytes, time.monotonic() - start)
+    return output_filename
+
+async def _bounded(semaphore: asyncio.Semaphore, coro_function, *coro_args):
+    """Runs coro_function(*coro_args) while holding one of the semaphore's max_workers slots."""
+    async with semaphore:
+        return await coro_function(*coro_args)
+
+_OUTPUT_NAME_RE = re.compile(r"round_(\d+)_batch_(\d+)\.txt")
+
+def _output_order(path: Path) -> Tuple[int, int]:
+    """Returns (round, batch) from an output name, for numeric sorting."""
+    match = _OUTPUT_NAME_RE.match(path.name)
+    return int(match[1]), int(match[2])
+
+async def run_distillation_round(
     input_files: List[Path], 
     round_number: int, 
     output_path: Path, 
-    args: argparse.Namespace
+    cfg: RunConfig,
+    file_sizes: Dict[Path, int],
+    sizer: _AdaptiveBatchSize,
+    manifest: Dict[frozenset, Tuple[Path, str]]
 ) -> List[Path] or None:
     """
     Processes a list of input files in batches and generates distilled output files.
     Skips batches if resuming and their output already exists.
     """
-    print(f"\n--- Starting Round {round_number} ---")
-    print(f"Processing {len(input_files)} files in this round.")
+    logger.info("\n--- Starting Round %s ---", round_number)
+    logger.info("Processing %s files in this round.", len(input_files))
     
+    max_batch_size_kb = sizer.for_round(round_number)
     # <<< MODIFIED: Call the new size-based batching function >>>
     batches = create_batches_by_size(
         input_files, 
-        args.max_batch_size_kb, 
-        args.large_file_threshold_kb
+        max_batch_size_kb, 
+        cfg.large_file_threshold_kb,
+        file_sizes
     )
-    print(f"Divided into {len(batches)} batches based on file sizes.")
+    logger.info("Divided into %s batches based on file sizes (max %s KB per batch).", len(batches), max_batch_size_kb)
 
     output_files = []
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers) as executor:
-        future_to_batch_number = {}
-
-        for i, batch in enumerate(batches):
-            batch_number = i + 1
-            expected_output = output_path / f"round_{round_number}_batch_{batch_number}.txt"
-
-            if args.resume and expected_output.exists():
-                print(f"  -> SKIPPING Batch {batch_number} (Round {round_number}): Output file already exists.")
-                output_files.append(expected_output)
-                continue
-
-            future = executor.submit(
-                _process_single_batch, 
-                batch, 
-                round_number, 
-                batch_number, 
-                output_path, 
-                args.model, 
-                args.prompt, # We need the prompt here, so pass it in `args`
-                args.timeout
-            )
-            future_to_batch_number[future] = batch_number
-
-        for future in concurrent.futures.as_completed(future_to_batch_number):
-            batch_number = future_to_batch_number[future]
-            try:
-                output_file = future.result()
-                if output_file:
-                    output_files.append(output_file)
-            except Exception as exc:
-                print(f"Batch {batch_number} generated an exception: {exc}")
-                executor.shutdown(wait=False, cancel_futures=True)
-                return None
-                
-    return sorted(output_files, key=lambda p: p.name)
-
-def main():
-    """Main function to run the entire distillation pipeline."""
+    # All batches share one event loop; the semaphore caps how many gemini processes run at once
+    semaphore = asyncio.Semaphore(cfg.max_workers)
+    task_to_batch_number = {}
+
+    for i, batch in enumerate(batches):
+        batch_number = i + 1
+        expected_output = output_path / f"round_{round_number}_batch_{batch_number}.txt"
+
+        # An existing output is only trusted if the manifest says it came from exactly
+        # these inputs; batches can come out differently between runs
+        recorded_output = _recorded_output(manifest, batch) if cfg.resume else None
+        if recorded_output == expected_output:
+            logger.info("  -> SKIPPING Batch %s (Round %s): Output file already exists for these inputs.", batch_number, round_number)
+            output_files.append(expected_output)
+            continue
+        if recorded_output is not None and _reuse_output(recorded_output, expected_output):
+            logger.info("  -> REUSING Batch %s (Round %s): The manifest has an output for these exact inputs.", batch_number, round_number)
+            output_files.append(expected_output)
+            continue
+
+        task = asyncio.create_task(_bounded(
+            semaphore,
+            _timed_batch, 
+            sizer,
+            batch, 
+            # Sizes were cached when the batcher stat()ed the files, so the log line costs no syscalls
+            sum(get_file_size(p, file_sizes) for p in batch),
+            round_number, 
+            batch_number, 
+            output_path, 
+            cfg.model, 
+            cfg.prompt,
+            cfg.prompt_reference,
+            cfg.timeout
+        ))
+        task_to_batch_number[task] = batch_number
+
+    if task_to_batch_number:
+        done, pending = await asyncio.wait(task_to_batch_number, return_when=asyncio.FIRST_EXCEPTION)
+        failed = [task for task in sorted(done, key=task_to_batch_number.get) if task.exception() is not None]
+        if failed:
+            logger.error("Batch %s generated an exception: %s", task_to_batch_number[failed[0]], failed[0].exception())
+            # Cancelling a task kills its gemini child process
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            return None
+        output_files.extend(task.result() for task in done)
+
+    return sorted(output_files, key=_output_order)
+
+def run_distillation():
+    """Runs the entire distillation pipeline."""
     args = get_args()
     
     source_path = Path(args.source_dir).resolve()
     output_path = Path(args.output_dir).resolve()
     prompt_file_path = Path(args.prompt_file).resolve()
 
-    print("--- LLM Distillation Script Initializing ---")
-    print("Configuration:")
+    logger.info("--- LLM Distillation Script Initializing ---")
+    logger.info("Configuration:")
     config_dict = vars(args)
     config_dict['source_dir_resolved'] = source_path
     config_dict['output_dir_resolved'] = output_path
@@ -282,56 +556,82 @@ def main():
     
     for arg, value in sorted(config_dict.items()):
         if '_resolved' in arg:
-            print(f"  - {arg.replace('_', ' ').replace('resolved', '(resolved)')}: {value}")
+            logger.info("  - %s: %s", arg.replace('_', ' ').replace('resolved', '(resolved)'), value)
         else:
             # Use replace for better looking keys
-            print(f"  - {arg.replace('_', ' ').capitalize()}: {value}")
+            logger.info("  - %s: %s", arg.replace('_', ' ').capitalize(), value)
 
-    print("--------------------------------------------")
+    logger.info("--------------------------------------------")
 
     if not source_path.is_dir():
-        print(f"[ERROR] Source directory not found: '{source_path}'")
+        logger.error("[ERROR] Source directory not found: '%s'", source_path)
         return
 
     if not prompt_file_path.is_file():
-        print(f"[ERROR] Prompt file not found: '{prompt_file_path}'")
+        logger.error("[ERROR] Prompt file not found: '%s'", prompt_file_path)
         return
         
-    try:
-        with open(prompt_file_path, "r", encoding="utf-8") as f:
-            # <<< MODIFIED: Store prompt in args so it can be passed easily >>>
-            args.prompt = f.read()
-    except Exception as e:
-        print(f"[ERROR] Could not read the prompt file: {e}")
-        return
-
+    if not args.prompt_by_reference:
+        try:
+            prompt = prompt_file_path.read_text(encoding="utf-8")
+        except Exception as e:
+            logger.error("[ERROR] Could not read the prompt file: %s", e)
+            return
+        if not _fits_in_argv(prompt):
+            logger.info("[INFO] The prompt is too large for the command line; passing it to gemini as an @reference instead.")
+            args.prompt_by_reference = True
+    prompt_reference = _file_reference(prompt_file_path)
+    if args.prompt_by_reference:
+        # gemini reads the prompt file itself; each batch's argv only carries its @reference
+        prompt = prompt_reference
+
+    trash_path = None
     if args.resume:
-        print(f"Resume mode enabled. Will not clear output directory: '{output_path}'")
+        logger.info("Resume mode enabled. Will not clear output directory: '%s'", output_path)
         os.makedirs(output_path, exist_ok=True)
     else:
         if output_path.exists():
-            print(f"Output directory '{output_path}' already exists. Clearing it for a fresh run.")
-            shutil.rmtree(output_path)
+            logger.info("Output directory '%s' already exists. Clearing it for a fresh run.", output_path)
+            # Renaming is instant; the old run's files are deleted in the background while round 1 runs
+            trash_path = output_path.with_name(f"{output_path.name}.trash.{os.getpid()}")
+            os.rename(output_path, trash_path)
+            threading.Thread(target=shutil.rmtree, args=(trash_path,), kwargs={"ignore_errors": True}).start()
         os.makedirs(output_path)
     
-    initial_files = sorted([p for p in source_path.glob(f"**/*{args.extension}")])
+    # One scandir walk finds the files and their sizes; batching never stat()s them again
+    file_sizes = dict(walk_files_with_sizes(source_path, args.extension, trash_path))
+    initial_files = sorted(file_sizes)
 
     if not initial_files:
-        print(f"[ERROR] No files with extension '{args.extension}' found in '{source_path}'.")
+        logger.error("[ERROR] No files with extension '%s' found in '%s'.", args.extension, source_path)
         return
 
-    print(f"Found {len(initial_files)} source files to process.")
+    logger.info("Found %s source files to process.", len(initial_files))
     current_files = initial_files
     round_count = 1
+    cfg = RunConfig(
+        model=args.model,
+        prompt=prompt,
+        prompt_reference=prompt_reference,
+        timeout=args.timeout,
+        max_workers=args.max_workers,
+        resume=args.resume,
+        max_batch_size_kb=args.max_batch_size_kb,
+        large_file_threshold_kb=args.large_file_threshold_kb,
+        target_batch_latency_s=args.target_batch_latency_s,
+        batch_size_kb_min=args.batch_size_kb_min,
+        batch_size_kb_max=args.batch_size_kb_max,
+    )
+    sizer = _AdaptiveBatchSize(cfg, output_path)
+    manifest = load_manifest(output_path) if args.resume else {}
 
     while len(current_files) > 1:
-        # <<< MODIFIED: Pass the whole `args` object >>>
-        distilled_files = run_distillation_round(
-            current_files, round_count, output_path, args
-        )
+        distilled_files = asyncio.run(run_distillation_round(
+            current_files, round_count, output_path, cfg, file_sizes, sizer, manifest
+        ))
         if distilled_files is None:
-            print("\nAborting script due to an error in the distillation round.")
-            print("To continue, run the script again with the --resume flag.")
+            logger.error("\nAborting script due to an error in the distillation round.")
+            logger.error("To continue, run the script again with the --resume flag.")
             return
         current_files = distilled_files
         round_count += 1
@@ -340,17 +640,32 @@ def main():
         final_file = current_files[0]
         final_destination = output_path / "ULTRA_DISTILLED_SUMMARY.txt"
         shutil.move(str(final_file), str(final_destination))
-        print("\n==============================================")
-        print("✅ Distillation Complete!")
-        print(f"The final summary has been saved as:")
-        print(f"   {final_destination}")
-        print("==============================================")
+        logger.info("\n==============================================")
+        logger.info("✅ Distillation Complete!")
+        logger.info("The final summary has been saved as:")
+        logger.info("   %s", final_destination)
+        logger.info("==============================================")
     elif len(current_files) == 1 and round_count == 1:
-        print("\n[INFO] Only one batch was processed. The result is in the output folder.")
+        logger.info("\n[INFO] Only one batch was processed. The result is in the output folder.")
     elif not current_files:
-         print("\n[ERROR] No distilled files were produced in the last round. Aborting.")
+         logger.error("\n[ERROR] No distilled files were produced in the last round. Aborting.")
     else:
-        print(f"\n[INFO] Distillation finished. {len(current_files)} files remaining in the output directory.")
+        logger.info("\n[INFO] Distillation finished. %s files remaining in the output directory.", len(current_files))
+
+def main():
+    """Main function: routes all output through one queued log handler, then runs the pipeline."""
+    # Records are queued and written by a listener thread, so batches never block on stdout
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    listener.start()
+    try:
+        run_distillation()
+    finally:
+        listener.stop()
 
 if __name__ == "__main__":
     main()
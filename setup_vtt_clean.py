@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+Builds the optional vtt_clean Cython extension used by process_bookmarks_v3.py
+and subtitle_downloader_with_cleaning.py.
+
+    pip install cython
+    python setup_vtt_clean.py build_ext --inplace
+
+Without the extension the scripts fall back to the pure Python cleaner.
+"""
+
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+setup(
+    name='vtt_clean',
+    ext_modules=cythonize([Extension('vtt_clean', ['vtt_clean.pyx'])]),
+)
@@ -1,11 +1,39 @@
 #!/usr/bin/env python3
 
 import os
+import errno
 import subprocess
 import argparse
 import re
 import shutil
 import json
+import io
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+try:
+    # vtt_clean is only there once setup_vtt_clean.py has been built
+    from vtt_clean import clean_vtt_lines as clean_vtt_lines_compiled
+except ImportError:
+    clean_vtt_lines_compiled = None
+
+try:
+    # google-re2: linear-time matching for the tag pattern
+    import re2
+except ImportError:
+    re2 = re
+
+# Compiled once for clean_vtt_lines_python
+# Prefixes of the WEBVTT header and metadata lines; same check as vtt_clean.pyx,
+# so the output doesn't depend on whether the extension is built
+VTT_HEADER_PREFIXES = ('WEBVTT', 'Kind:', 'Language:')
+# RE2's \s and $ are ASCII/end-of-text only, so just the tag pattern goes through it
+_TAG_RE = re2.compile(r'<[^>]*>')
+_WS_RE = re.compile(r'\s+')
+
+# Channel folders this process has already created
+_created_dirs = set()
 
 def sanitize_filename(filename):
     """
@@ -18,44 +46,141 @@ def sanitize_filename(filename):
     sanitized = re.sub(r'\s+', ' ', sanitized).strip()
     return sanitized
 
+def rename_or_move(src, dst):
+    """Moves src to dst; shutil.move is only needed across filesystems."""
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
+
+def clean_vtt_lines_python(lines):
+    """
+    Takes the text lines of a VTT file and returns the cleaned, de-duplicated
+    lines prefixed with '- ' (without trailing newlines).
+    """
+    # Hashes of the lines already kept; a collision would only drop one line
+    seen_hashes = set()
+    output_lines = []
+    for line in lines:
+        # Skip header, metadata and timestamps
+        if line.lstrip().startswith(VTT_HEADER_PREFIXES) or '-->' in line:
+            continue
+        # Strip HTML tags, then " >>" (which often appears as &gt;&gt;; tags can
+        # split it), then normalize whitespace and strip leading/trailing space
+        line = _WS_RE.sub(' ', _TAG_RE.sub('', line).replace('&gt;&gt;', '')).strip()
+        # Skip blank lines that might result from cleaning
+        if not line:
+            continue
+        # Prepend with dash and space
+        line_to_check = f'- {line}'
+        # Ensure uniqueness
+        line_hash = hash(line_to_check)
+        if line_hash not in seen_hashes:
+            output_lines.append(line_to_check)
+            seen_hashes.add(line_hash)
+    return output_lines
+
 def clean_vtt_file_python(input_filepath, output_filepath):
     """
-    Applies cleaning operations to a VTT file using pure Python.
+    Applies cleaning operations to a VTT file.
     Removes WEBVTT header, metadata, timestamps, blank lines, HTML tags,
     and duplicate lines. Prepends lines with '- '.
+    Prefers the compiled vtt_clean loop and falls back to clean_vtt_lines_python.
     """
-    seen_lines = set()
     try:
-        with open(input_filepath, 'r', encoding='utf-8') as infile, \
-             open(output_filepath, 'w', encoding='utf-8') as outfile:
-            for line in infile:
-                # Skip header and metadata
-                if line.strip() == 'WEBVTT' or 'Kind:' in line or 'Language:' in line:
-                    continue
-                # Skip timestamps
-                if '-->' in line:
-                    continue
-                # Strip HTML tags
-                line = re.sub(r'<[^>]*>', '', line)
-                # Strip " >>" which often appears as &gt;&gt;
-                line = line.replace('&gt;&gt;', '')
-                # Normalize whitespace and strip leading/trailing space
-                line = re.sub(r'\s+', ' ', line).strip()
-                # Skip blank lines that might result from cleaning
-                if not line:
-                    continue
-                # Prepend with dash and space
-                line_to_check = f'- {line}'
-                # Ensure uniqueness
-                if line_to_check not in seen_lines:
-                    outfile.write(line_to_check + '\n')
-                    seen_lines.add(line_to_check)
+        if clean_vtt_lines_compiled is not None:
+            # The extension works on raw byte lines and only decodes the ones it keeps
+            with open(input_filepath, 'rb') as infile:
+                output_lines = clean_vtt_lines_compiled(infile.read().splitlines())
+        else:
+            with open(input_filepath, 'r', encoding='utf-8') as infile:
+                output_lines = clean_vtt_lines_python(infile)
+        # One write for the whole file instead of one per line
+        with open(output_filepath, 'w', encoding='utf-8') as outfile:
+            outfile.write(''.join(f'{line}\n' for line in output_lines))
         print(f"Cleaned '{input_filepath}' to '{output_filepath}'")
         return True
     except Exception as e:
         print(f"An unexpected error occurred during Python cleaning of {input_filepath}: {e}")
         return False
 
+def organize_subtitle(json_path, vtt_path, output_path):
+    """
+    Cleans one downloaded VTT file and moves it into its channel folder.
+    Runs in a worker process and returns what it printed, so the parent can
+    show each file's messages together.
+    """
+    vtt_filename = os.path.basename(vtt_path)
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+
+        # Extract data from metadata
+        upload_date = metadata.get('upload_date', '')
+        video_id = metadata.get('id', '')
+        playlist = metadata.get('playlist', '')
+        uploader_id = metadata.get('uploader_id', '')
+        channel_id = metadata.get('channel_id', '')
+        title = metadata.get('title', '')
+        lang = 'es'
+        ext = 'vtt'
+
+        # Sanitize parts for final filename and folder name
+        playlist_clean = sanitize_filename(playlist)
+        uploader_id_clean = sanitize_filename(uploader_id.replace('@', ''))
+        channel_id_clean = sanitize_filename(channel_id)
+        title_clean = sanitize_filename(title)
+
+        # Construct final clean filename
+        final_filename_parts = [
+            f"({upload_date})",
+            f"[{video_id}]",
+            playlist_clean,
+            uploader_id_clean,
+            channel_id_clean,
+            title_clean,
+            lang,
+            'cleaned',
+            ext
+        ]
+        final_filename = '.'.join(filter(None, final_filename_parts))
+
+        # Construct final folder name
+        folder_name_parts = [channel_id_clean, uploader_id_clean, playlist_clean]
+        folder_name = '.'.join(filter(None, folder_name_parts))
+
+        if not folder_name:
+            print(f"Could not determine a valid directory name for {vtt_filename}. Leaving in temp folder.")
+            os.remove(json_path) # remove json file
+            return log.getvalue()
+
+        # Clean the VTT file
+        cleaned_temp_path = vtt_path.replace('.vtt', '.cleaned.vtt')
+        if clean_vtt_file_python(vtt_path, cleaned_temp_path):
+            os.remove(vtt_path)
+        else:
+            print(f"Skipping organization for failed-to-clean file: {vtt_filename}")
+            os.remove(json_path) # remove json file
+            return log.getvalue()
+
+        # Move and rename the cleaned file
+        channel_dir = os.path.join(output_path, folder_name)
+        if channel_dir not in _created_dirs:
+            os.makedirs(channel_dir, exist_ok=True)
+            _created_dirs.add(channel_dir)
+        dest_path = os.path.join(channel_dir, final_filename)
+
+        print(f"Moving and renaming {cleaned_temp_path} to {dest_path}")
+        try:
+            rename_or_move(cleaned_temp_path, dest_path)
+            os.remove(json_path) # remove json file
+        except FileNotFoundError:
+            print(f"Error moving file: {cleaned_temp_path} not found.")
+    return log.getvalue()
+
 def download_and_organize_subtitles(batch_file, datebefore, dateafter, sub_langs, output_path):
     """
     Downloads subtitles and then organizes them into folders by channel handle.
@@ -103,79 +228,27 @@ def download_and_organize_subtitles(batch_file, datebefore, dateafter, sub_langs
 
     # --- Pass 2: Organize subtitles into folders ---
     print("--- Starting Pass 2: Organizing subtitles ---")
-    for filename in os.listdir(temp_dir):
+    # One directory scan; the VTT sibling of each .info.json is then a dict lookup
+    with os.scandir(temp_dir) as it:
+        temp_files = {entry.name: entry.path for entry in it if entry.is_file()}
+    json_paths, vtt_paths = [], []
+    for filename, json_path in temp_files.items():
         if filename.endswith('.info.json'):
-            json_path = os.path.join(temp_dir, filename)
             vtt_filename = filename.replace('.info.json', '.es.vtt')
-            vtt_path = os.path.join(temp_dir, vtt_filename)
-
-            if os.path.exists(vtt_path):
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
-
-                # Extract data from metadata
-                upload_date = metadata.get('upload_date', '')
-                video_id = metadata.get('id', '')
-                playlist = metadata.get('playlist', '')
-                uploader_id = metadata.get('uploader_id', '')
-                channel_id = metadata.get('channel_id', '')
-                title = metadata.get('title', '')
-                lang = 'es'
-                ext = 'vtt'
-
-                # Sanitize parts for final filename and folder name
-                playlist_clean = sanitize_filename(playlist)
-                uploader_id_clean = sanitize_filename(uploader_id.replace('@', ''))
-                channel_id_clean = sanitize_filename(channel_id)
-                title_clean = sanitize_filename(title)
-
-                # Construct final clean filename
-                final_filename_parts = [
-                    f"({upload_date})",
-                    f"[{video_id}]",
-                    playlist_clean,
-                    uploader_id_clean,
-                    channel_id_clean,
-                    title_clean,
-                    lang,
-                    'cleaned',
-                    ext
-                ]
-                final_filename = '.'.join(filter(None, final_filename_parts))
-                
-                # Construct final folder name
-                folder_name_parts = [channel_id_clean, uploader_id_clean, playlist_clean]
-                folder_name = '.'.join(filter(None, folder_name_parts))
-                
-                if not folder_name:
-                    print(f"Could not determine a valid directory name for {vtt_filename}. Leaving in temp folder.")
-                    os.remove(json_path) # remove json file
-                    continue
-
-                # Clean the VTT file
-                cleaned_temp_path = vtt_path.replace('.vtt', '.cleaned.vtt')
-                if clean_vtt_file_python(vtt_path, cleaned_temp_path):
-                    os.remove(vtt_path)
-                else:
-                    print(f"Skipping organization for failed-to-clean file: {vtt_filename}")
-                    os.remove(json_path) # remove json file
-                    continue
-
-                # Move and rename the cleaned file
-                channel_dir = os.path.join(output_path, folder_name)
-                os.makedirs(channel_dir, exist_ok=True)
-                dest_path = os.path.join(channel_dir, final_filename)
-
-                print(f"Moving and renaming {cleaned_temp_path} to {dest_path}")
-                try:
-                    shutil.move(cleaned_temp_path, dest_path)
-                    os.remove(json_path) # remove json file
-                except FileNotFoundError:
-                    print(f"Error moving file: {cleaned_temp_path} not found.")
+            vtt_path = temp_files.get(vtt_filename)
+
+            if vtt_path is not None:
+                json_paths.append(json_path)
+                vtt_paths.append(vtt_path)
             else:
                 print(f"VTT file not found for {filename}. Skipping.")
                 os.remove(json_path) # remove json file
 
+    # Cleaning is CPU-bound and independent per file
+    with ProcessPoolExecutor() as executor:
+        organize = partial(organize_subtitle, output_path=output_path)
+        for output in executor.map(organize, json_paths, vtt_paths, chunksize=16):
+            print(output, end='')
 
     print("--- Finished Pass 2: Organizing subtitles ---")
     if os.path.isdir(temp_dir) and not os.listdir(temp_dir):
@@ -1,12 +1,27 @@
 #!/usr/bin/env python3
 import os
+import errno
 import subprocess
 import shutil
 import argparse
+import asyncio
+import threading
+import logging
+import logging.handlers
+import queue
+import sys
 from pathlib import Path
-import concurrent.futures
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 import heapq
+import itertools
+import bisect
+
+logger = logging.getLogger(__name__)
+
+# Batches of more than COALESCE_MIN_FILES files totalling under COALESCE_MAX_BYTES are
+# concatenated into one input file, so gemini opens one file instead of one per source
+COALESCE_MIN_FILES = 4
+COALESCE_MAX_BYTES = 1024 * 1024
 
 def get_args():
     """Parses and returns command-line arguments."""
@@ -78,7 +93,7 @@ def get_args():
         "-w", "--max-workers",
         type=int,
         default=3,
-        help="Max number of concurrent workers (threads) for processing batches."
+        help="Max number of gemini-cli processes running at the same time."
     )
     parser.add_argument(
         "-t", "--timeout",
@@ -96,6 +111,36 @@ def get_args():
 
     return parser.parse_args()
 
+def walk_files_with_sizes(root: Path, extension: str, exclude_dir: Optional[Path] = None) -> List[Tuple[Path, int]]:
+    """Returns (path, size) for every file under root ending in extension, skipping the exclude_dir subtree."""
+    found: List[Tuple[Path, int]] = []
+    excluded = str(exclude_dir) if exclude_dir else None
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except OSError as e:
+            # An unreadable or vanished directory is skipped, as glob did
+            logger.warning("[WARNING] Skipping unreadable directory %s: %s", directory, e)
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path == excluded:
+                        continue
+                    stack.append(entry.path)
+                elif entry.name.endswith(extension) and entry.is_file():
+                    found.append((Path(entry.path), entry.stat().st_size))
+    return found
+
+def get_file_size(path: Path, file_sizes: Dict[Path, int]) -> int:
+    """Size of path in bytes, stat()ed once and then kept in file_sizes."""
+    size = file_sizes.get(path)
+    if size is None:
+        size = file_sizes[path] = path.stat().st_size
+    return size
+
 def create_batches_by_count(file_list: List[Path], batch_size: int) -> List[List[Path]]:
     """Splits files into batches by a fixed number of files."""
     if not file_list:
@@ -105,23 +150,28 @@ def create_batches_by_count(file_list: List[Path], batch_size: int) -> List[List
 def create_batches_by_greedy_size(
     file_list: List[Path], 
     max_batch_size_kb: int, 
-    large_file_threshold_kb: int
+    large_file_threshold_kb: int,
+    file_sizes: Optional[Dict[Path, int]] = None
 ) -> List[List[Path]]:
     """
     Splits files into batches using a greedy algorithm based on file size.
+    Files at or above the large-file threshold get their own batch; the rest are
+    packed best-fit decreasing into batches of at most max_batch_size_kb.
     """
     if not file_list:
         return []
 
     max_size_bytes = max_batch_size_kb * 1024
     large_file_bytes = large_file_threshold_kb * 1024
+    if file_sizes is None:
+        file_sizes = {}
 
     try:
         files_with_sizes: List[Tuple[Path, int]] = [
-            (p, p.stat().st_size) for p in file_list
+            (p, get_file_size(p, file_sizes)) for p in file_list
         ]
     except FileNotFoundError as e:
-        print(f"[ERROR] A file could not be found during batch creation: {e}")
+        logger.error("[ERROR] A file could not be found during batch creation: %s", e)
         raise
 
     files_with_sizes.sort(key=lambda x: x[1], reverse=True)
@@ -135,37 +185,28 @@ def create_batches_by_greedy_size(
         else:
             files_to_pack.append((path, size))
             
-    if files_to_pack:
-        current_batch: List[Path] = []
-        current_batch_size = 0
-        for path, size in files_to_pack:
-            if current_batch and current_batch_size + size > max_size_bytes:
-                all_batches.append(current_batch)
-                current_batch = []
-                current_batch_size = 0
-            
-            current_batch.append(path)
-            current_batch_size += size
-        
-        if current_batch:
-            all_batches.append(current_batch)
+    # Best-fit decreasing: each file goes into the open batch with the least room left that
+    # still fits it. free_space stays sorted by (remaining_bytes, batch_index), so the
+    # lookup is a bisect instead of a scan over every batch.
+    packed_batches: List[List[Path]] = []
+    free_space: List[Tuple[int, int]] = []
+    for path, size in files_to_pack:
+        i = bisect.bisect_left(free_space, (size, -1))
+        if i == len(free_space):
+            packed_batches.append([path])
+            bisect.insort(free_space, (max_size_bytes - size, len(packed_batches) - 1))
+        else:
+            remaining, batch_index = free_space.pop(i)
+            packed_batches[batch_index].append(path)
+            bisect.insort(free_space, (remaining - size, batch_index))
 
+    all_batches.extend(packed_batches)
     return all_batches
 
-class _Bin:
-    """Helper for the bin-packing algorithm."""
-    __slots__ = ("paths", "size")
-
-    def __init__(self) -> None:
-        self.paths: List[Path] = []
-        self.size: int = 0
-
-    def __lt__(self, other: "_Bin") -> bool:
-        return self.size < other.size
-
 def create_balanced_batches(
     file_list: List[Path],
     max_files_per_batch: int,
+    file_sizes: Optional[Dict[Path, int]] = None
 ) -> List[List[Path]]:
     """
     Splits files into batches with the most evenly distributed total byte size
@@ -174,137 +215,360 @@ def create_balanced_batches(
     if not file_list:
         return []
 
+    if file_sizes is None:
+        file_sizes = {}
+
     sized_files: List[Tuple[int, Path]] = [
-        (p.stat().st_size, p) for p in file_list
+        (get_file_size(p, file_sizes), p) for p in file_list
     ]
     sized_files.sort(reverse=True, key=lambda t: t[0])
 
     num_batches = max(1, (len(file_list) + max_files_per_batch - 1) // max_files_per_batch)
 
-    bins: List[_Bin] = [_Bin() for _ in range(num_batches)]
-    heapq.heapify(bins)
+    # Heap entries are (total_size, seq, paths): tuples compare in C, and the unique seq
+    # breaks size ties so the path lists themselves are never compared
+    seq = itertools.count()
+    bins: List[Tuple[int, int, List[Path]]] = [(0, next(seq), []) for _ in range(num_batches)]
+    full_bins: List[List[Path]] = []
 
     for size, path in sized_files:
-        smallest_bin = heapq.heappop(bins)
-        
-        if len(smallest_bin.paths) >= max_files_per_batch:
-            new_bin = _Bin()
-            new_bin.paths.append(path)
-            new_bin.size = size
-            heapq.heappush(bins, new_bin)
+        # A bin that reached the file-count limit can take nothing more; set it aside
+        while bins and len(bins[0][2]) >= max_files_per_batch:
+            full_bins.append(heapq.heappop(bins)[2])
+        if bins:
+            bin_size, _, paths = bins[0]
+            paths.append(path)
+            heapq.heapreplace(bins, (bin_size + size, next(seq), paths))
         else:
-            smallest_bin.paths.append(path)
-            smallest_bin.size += size
-            heapq.heappush(bins, smallest_bin)
-
-    return [b.paths for b in bins if b.paths]
-
-def _process_single_batch(batch: List[Path], round_number: int, batch_number: int, output_dir: Path, model: str, prompt: str, timeout: int):
+            heapq.heappush(bins, (size, next(seq), [path]))
+
+    return [paths for paths in full_bins + [b[2] for b in bins] if paths]
+
+def _file_reference(path: Path) -> bytes:
+    """Formats path as a gemini-cli @reference in bytes, escaping spaces."""
+    return b"@" + os.fsencode(path).replace(b" ", b"\\ ")
+
+def _concatenate_batch(batch: List[Path], destination: Path) -> None:
+    """Writes every file of batch into destination, each preceded by a '=== FILE: name ===' marker."""
+    with open(destination, "wb", buffering=0) as output_file:
+        out_fd = output_file.fileno()
+        for path in batch:
+            output_file.write(f"\n=== FILE: {path.name} ===\n".encode("utf-8"))
+            with open(path, "rb") as source_file:
+                # sendfile copies inside the kernel, without reading the file into Python
+                offset, size = 0, os.fstat(source_file.fileno()).st_size
+                while offset < size:
+                    sent = os.sendfile(out_fd, source_file.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+
+def _advise_page_cache(paths: List[Path], advice: int) -> None:
+    """Passes a posix_fadvise hint for the whole of each file; a no-op where the call is missing."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, advice)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+async def _process_single_batch(batch: List[Path], batch_bytes: int, round_number: int, batch_number: int, output_dir: Path, command: Tuple[str, ...], timeout: int):
     """
-    Helper function to process a single batch in a separate thread.
+    Coroutine that processes a single batch with one gemini-cli child process.
     """
-    batch_size_kb = sum(p.stat().st_size for p in batch) / 1024
-    print(f"  -> Processing Batch {batch_number} (Round {round_number}) - {len(batch)} files, {batch_size_kb:.2f} KB...")
+    batch_size_kb = batch_bytes / 1024
+    logger.info("  -> Processing Batch %s (Round %s) - %s files, %.2f KB...", batch_number, round_number, len(batch), batch_size_kb)
 
-    file_references = " ".join([f"'@{{str(file_path)}}'" for file_path in batch])
-    full_prompt = f"{prompt} {file_references}"
-    command_str = f"gemini -m {model} -y -p \"{full_prompt}\""
+    output_filename = output_dir / f"round_{round_number}_batch_{batch_number}.txt"
+    # gemini writes straight into a temp file; it only gets the final name once the call succeeded,
+    # so --resume never mistakes a partial response for a finished batch
+    temp_filename = output_filename.with_name(output_filename.name + ".tmp")
+    concatenated_input = output_dir / f".batch_{round_number}_{batch_number}.cat"
 
     try:
-        result = subprocess.run(
-            command_str,
-            shell=True,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8',
-            timeout=timeout
-        )
-        output_filename = output_dir / f"round_{{round_number}}_batch_{{batch_number}}.txt"
-        with open(output_filename, "w", encoding='utf-8') as f:
-            f.write(result.stdout)
-        print(f"     Success! Saved distilled output to: {output_filename.name}")
+        input_files = batch
+        if len(batch) > COALESCE_MIN_FILES and batch_bytes < COALESCE_MAX_BYTES and hasattr(os, "sendfile"):
+            # Blocking file I/O; a worker thread keeps it off the event loop the other batches run on
+            await asyncio.to_thread(_concatenate_batch, batch, concatenated_input)
+            input_files = [concatenated_input]
+        # The file list goes to gemini on stdin, one @reference per line (spaces escaped the way
+        # gemini-cli expects), so argv stays small however many files the batch holds
+        file_references = b"\n".join(_file_reference(file_path) for file_path in input_files)
+        # Start readahead of the inputs now so it overlaps gemini-cli's own startup
+        if hasattr(os, "POSIX_FADV_WILLNEED"):
+            _advise_page_cache(input_files, os.POSIX_FADV_WILLNEED)
+
+        with open(temp_filename, "wb") as output_file:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *command,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=output_file,
+                    stderr=asyncio.subprocess.PIPE
+                )
+            except FileNotFoundError:
+                logger.error("\n[ERROR] 'gemini' command not found. Please ensure gemini-cli is installed and in your PATH.")
+                raise
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(file_references), timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise subprocess.TimeoutExpired(command, timeout) from None
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(
+                process.returncode, command, None, stderr.decode('utf-8', errors='replace')
+            )
+
+        os.replace(temp_filename, output_filename)
+        # Each file is read by exactly one batch, so its cached pages can go once the batch is done
+        if hasattr(os, "POSIX_FADV_DONTNEED"):
+            _advise_page_cache(batch, os.POSIX_FADV_DONTNEED)
+        logger.info("     Success! Saved distilled output to: %s", output_filename.name)
         return output_filename
-    except FileNotFoundError:
-        print(f"\n[ERROR] 'gemini' command not found. Please ensure gemini-cli is installed and in your PATH.")
+    except FileNotFoundError as e:
+        # A missing gemini was already reported where it was launched
+        if e.filename != command[0]:
+            logger.error("\n[ERROR] An input file of Batch %s is missing: %s", batch_number, e.filename)
         raise
     except subprocess.TimeoutExpired:
-        print(f"\n[ERROR] Command timed out for Batch {batch_number} after {timeout} seconds.")
+        logger.error("\n[ERROR] Command timed out for Batch %s after %s seconds.", batch_number, timeout)
         raise
     except subprocess.CalledProcessError as e:
-        print(f"\n[ERROR] An error occurred while running gemini-cli for Batch {batch_number}.")
-        print(f"  Exit Code: {e.returncode}")
-        print(f"  Stderr: {e.stderr}")
+        logger.error("\n[ERROR] An error occurred while running gemini-cli for Batch %s.", batch_number)
+        logger.error("  Exit Code: %s", e.returncode)
+        logger.error("  Stderr: %s", e.stderr)
         raise
     except Exception as e:
-        print(f"\n[ERROR] An unexpected error occurred for Batch {batch_number}: {e}")
+        logger.error("\n[ERROR] An unexpected error occurred for Batch %s: %s", batch_number, e)
         raise
+    finally:
+        temp_filename.unlink(missing_ok=True)
+        concatenated_input.unlink(missing_ok=True)
 
-def run_distillation_round(
-    input_files: List[Path], 
-    round_number: int, 
-    output_path: Path, 
-    args: argparse.Namespace
-) -> List[Path] or None:
+async def _bounded(semaphore: asyncio.Semaphore, coro_function, *coro_args):
+    """Runs coro_function(*coro_args) while holding one of the semaphore's max_workers slots."""
+    async with semaphore:
+        return await coro_function(*coro_args)
+
+class _Pipeline:
     """
-    Processes a list of input files in batches and generates distilled output files.
+    State shared by all rounds of a pipelined distillation run.
+    A batch of round N+1 starts as soon as the round-N outputs it consumes exist,
+    so there is no barrier waiting for the slowest batch of each round.
     """
-    print(f"\n--- Starting Round {round_number} ---")
-    print(f"Processing {len(input_files)} files in this round.")
-    
-    if args.batch_mode == 'count':
-        batches = create_batches_by_count(input_files, args.batch_size)
-    elif args.batch_mode == 'size':
-        batches = create_batches_by_greedy_size(
-            input_files, 
-            args.max_batch_size_kb,
-            args.large_file_threshold_kb
-        )
-    elif args.batch_mode == 'balanced':
-        batches = create_balanced_batches(input_files, args.batch_size)
-    
-    print(f"Divided into {len(batches)} batches using '{args.batch_mode}' mode.")
 
-    output_files = []
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_workers) as executor:
-        future_to_batch_number = {}
+    def __init__(self, output_path: Path, args: argparse.Namespace, file_sizes: Dict[Path, int]) -> None:
+        self.output_path = output_path
+        self.args = args
+        self.semaphore = asyncio.Semaphore(args.max_workers)
+        self.tasks: List[asyncio.Task] = []
+        # Every file is stat()ed once; batching, logging and later rounds reuse the cached size
+        self.file_sizes = file_sizes
+        # Built once and shared by every batch, so the prompt is never copied per call
+        self.command = ("gemini", "-m", args.model, "-y", "-p", args.prompt)
+        # Outputs left by an interrupted run, listed with one scandir instead of an exists() per batch
+        self.existing_outputs = set()
+        if args.resume:
+            with os.scandir(output_path) as it:
+                self.existing_outputs = {entry.name for entry in it if entry.name.startswith("round_")}
+        # Resolves to (round_number, batch_number, exception) for the first batch that fails
+        self.failure: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def start_batch(self, batch: List[Path], round_number: int, batch_number: int) -> asyncio.Future:
+        """Starts one batch (or reuses its output when resuming); the returned future resolves to the output path."""
+        expected_output = self.output_path / f"round_{round_number}_batch_{batch_number}.txt"
+
+        if expected_output.name in self.existing_outputs:
+            logger.info("  -> SKIPPING Batch %s (Round %s): Output file already exists.", batch_number, round_number)
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(expected_output)
+            return future
+
+        task = asyncio.create_task(_bounded(
+            self.semaphore,
+            _process_single_batch, 
+            batch, 
+            sum(get_file_size(p, self.file_sizes) for p in batch),
+            round_number, 
+            batch_number, 
+            self.output_path, 
+            self.command,
+            self.args.timeout
+        ))
+        task.add_done_callback(lambda t: self._on_batch_done(t, round_number, batch_number))
+        self.tasks.append(task)
+        return task
+
+    def start_batch_when_ready(self, inputs: List[asyncio.Future], round_number: int, batch_number: int) -> asyncio.Task:
+        """
+        Starts a batch as soon as all of its input futures have resolved, whatever state the
+        other batches of its round are in; the returned task resolves to the output path.
+        """
+        async def wait_and_start() -> Path:
+            batch = list(await asyncio.gather(*inputs))
+            return await self.start_batch(batch, round_number, batch_number)
+
+        task = asyncio.create_task(wait_and_start())
+        self.tasks.append(task)
+        return task
+
+    def _on_batch_done(self, task: asyncio.Task, round_number: int, batch_number: int) -> None:
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None and not self.failure.done():
+            self.failure.set_result((round_number, batch_number, exc))
+
+    async def run_first_round(self, input_files: List[Path]) -> Tuple[List[Path], int]:
+        """Batches the source files with the configured mode, then hands their outputs to round 2."""
+        logger.info("\n--- Starting Round 1 ---")
+        logger.info("Processing %s files in this round.", len(input_files))
+
+        if self.args.batch_mode == 'count':
+            batches = create_batches_by_count(input_files, self.args.batch_size)
+        elif self.args.batch_mode == 'size':
+            batches = create_batches_by_greedy_size(
+                input_files, 
+                self.args.max_batch_size_kb,
+                self.args.large_file_threshold_kb,
+                self.file_sizes
+            )
+        elif self.args.batch_mode == 'balanced':
+            batches = create_balanced_batches(input_files, self.args.batch_size, self.file_sizes)
 
-        for i, batch in enumerate(batches):
-            batch_number = i + 1
-            expected_output = output_path / f"round_{{round_number}}_batch_{{batch_number}}.txt"
+        logger.info("Divided into %s batches using '%s' mode.", len(batches), self.args.batch_mode)
 
-            if args.resume and expected_output.exists():
-                print(f"  -> SKIPPING Batch {batch_number} (Round {round_number}): Output file already exists.")
-                output_files.append(expected_output)
+        outputs: asyncio.Queue = asyncio.Queue()
+        for i, batch in enumerate(batches):
+            outputs.put_nowait(self.start_batch(batch, 1, i + 1))
+        outputs.put_nowait(None)
+        return await self.run_round(2, outputs)
+
+    async def run_round(self, round_number: int, inputs: asyncio.Queue) -> Tuple[List[Path], int]:
+        """
+        Groups the previous round's outputs in batch order and starts each batch of this round
+        as soon as its inputs are ready. In 'count' and 'balanced' mode the grouping is known before
+        any output exists, so every node of the reduction tree waits only on its own children.
+        'size' mode needs each output's size, so it takes the outputs one by one in order.
+        Grouping only depends on batch order (and output sizes), so batch numbers stay stable for --resume.
+        Returns (remaining_files, round_count) for the round where fewer than two files are left.
+        """
+        max_size_bytes = self.args.max_batch_size_kb * 1024
+        large_file_bytes = self.args.large_file_threshold_kb * 1024
+
+        by_size = self.args.batch_mode == 'size'
+
+        outputs: asyncio.Queue = asyncio.Queue()
+        next_round = None
+        first_item = None
+        file_count = 0
+        batch_count = 0
+        batch: list = []
+        batch_bytes = 0
+
+        def flush(items: list) -> None:
+            nonlocal batch_count
+            batch_count += 1
+            if by_size:
+                outputs.put_nowait(self.start_batch(items, round_number, batch_count))
+            else:
+                outputs.put_nowait(self.start_batch_when_ready(items, round_number, batch_count))
+
+        while True:
+            item = await inputs.get()
+            if item is None:
+                break
+            if by_size:
+                item = await item
+            file_count += 1
+            if file_count == 1:
+                # A single remaining file is the final result, so wait for a second one before starting the round
+                first_item = item
                 continue
+            if file_count == 2:
+                logger.info("\n--- Starting Round %s ---", round_number)
+                next_round = asyncio.create_task(self.run_round(round_number + 1, outputs))
+                self.tasks.append(next_round)
+                pending_items = [first_item, item]
+            else:
+                pending_items = [item]
+
+            for file_path in pending_items:
+                if by_size:
+                    size = get_file_size(file_path, self.file_sizes)
+                    if size >= large_file_bytes:
+                        flush([file_path])
+                        continue
+                    if batch and batch_bytes + size > max_size_bytes:
+                        flush(batch)
+                        batch, batch_bytes = [], 0
+                    batch.append(file_path)
+                    batch_bytes += size
+                else:
+                    batch.append(file_path)
+                    if len(batch) >= self.args.batch_size:
+                        flush(batch)
+                        batch = []
+
+        if file_count < 2:
+            if first_item is None:
+                return [], round_number
+            return [first_item if by_size else await first_item], round_number
+
+        if batch:
+            flush(batch)
+        logger.info("Round %s: divided %s files into %s batches using '%s' mode.", round_number, file_count, batch_count, self.args.batch_mode)
+        outputs.put_nowait(None)
+        return await next_round
+
+async def run_distillation_pipeline(
+    input_files: List[Path], 
+    output_path: Path, 
+    args: argparse.Namespace,
+    file_sizes: Dict[Path, int]
+) -> Tuple[List[Path], int] or None:
+    """
+    Distills input_files round after round, overlapping rounds as their inputs become ready.
+    file_sizes may be pre-filled with known sizes; it is extended as new files are seen.
+    Returns (remaining_files, round_count), or None if a batch failed.
+    """
+    pipeline = _Pipeline(output_path, args, file_sizes)
+    rounds = asyncio.create_task(pipeline.run_first_round(input_files))
+    await asyncio.wait({rounds, pipeline.failure}, return_when=asyncio.FIRST_COMPLETED)
+
+    if pipeline.failure.done():
+        round_number, batch_number, exc = pipeline.failure.result()
+        logger.error("Batch %s (Round %s) generated an exception: %s", batch_number, round_number, exc)
+        # Cancelling a task kills its gemini child process
+        for task in pipeline.tasks + [rounds]:
+            task.cancel()
+        await asyncio.gather(*pipeline.tasks, rounds, return_exceptions=True)
+        return None
+
+    return rounds.result()
+
+def rename_or_move(src: Path, dst: Path) -> None:
+    """Renames src to dst, falling back to shutil.move across devices."""
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(src, dst)
 
-            future = executor.submit(
-                _process_single_batch, 
-                batch, 
-                round_number, 
-                batch_number, 
-                output_path, 
-                args.model, 
-                args.prompt,
-                args.timeout
-            )
-            future_to_batch_number[future] = batch_number
-
-        for future in concurrent.futures.as_completed(future_to_batch_number):
-            batch_number = future_to_batch_number[future]
-            try:
-                output_file = future.result()
-                if output_file:
-                    output_files.append(output_file)
-            except Exception as exc:
-                print(f"Batch {batch_number} generated an exception: {exc}")
-                executor.shutdown(wait=False, cancel_futures=True)
-                return None
-                
-    return sorted(output_files, key=lambda p: p.name)
-
-def main():
+async def main_async():
     """Main function to run the entire distillation pipeline."""
     args = get_args()
     
@@ -312,8 +576,8 @@ def main():
     output_path = Path(args.output_dir).resolve()
     prompt_file_path = Path(args.prompt_file).resolve()
 
-    print("--- LLM Distillation Script Initializing ---")
-    print("Configuration:")
+    logger.info("--- LLM Distillation Script Initializing ---")
+    logger.info("Configuration:")
     config_dict = vars(args)
     config_dict['source_dir_resolved'] = source_path
     config_dict['output_dir_resolved'] = output_path
@@ -321,72 +585,105 @@ def main():
     
     for arg, value in sorted(config_dict.items()):
         if '_resolved' in arg:
-            print(f"  - {arg.replace('_', ' ').replace('resolved', '(resolved)')}: {value}")
+            logger.info("  - %s: %s", arg.replace('_', ' ').replace('resolved', '(resolved)'), value)
         else:
-            print(f"  - {arg.replace('_', ' ').capitalize()}: {value}")
+            logger.info("  - %s: %s", arg.replace('_', ' ').capitalize(), value)
 
-    print("--------------------------------------------")
+    logger.info("--------------------------------------------")
 
     if not source_path.is_dir():
-        print(f"[ERROR] Source directory not found: '{source_path}'")
+        logger.error("[ERROR] Source directory not found: '%s'", source_path)
         return
 
     if not prompt_file_path.is_file():
-        print(f"[ERROR] Prompt file not found: '{prompt_file_path}'")
+        logger.error("[ERROR] Prompt file not found: '%s'", prompt_file_path)
         return
         
     try:
         with open(prompt_file_path, "r", encoding="utf-8") as f:
             args.prompt = f.read()
     except Exception as e:
-        print(f"[ERROR] Could not read the prompt file: {e}")
+        logger.error("[ERROR] Could not read the prompt file: %s", e)
         return
 
+    trash_path = None
     if args.resume:
-        print(f"Resume mode enabled. Will not clear output directory: '{output_path}'")
+        logger.info("Resume mode enabled. Will not clear output directory: '%s'", output_path)
         os.makedirs(output_path, exist_ok=True)
     else:
         if output_path.exists():
-            print(f"Output directory '{output_path}' already exists. Clearing it for a fresh run.")
-            shutil.rmtree(output_path)
+            logger.info("Output directory '%s' already exists. Clearing it for a fresh run.", output_path)
+            # Renaming is instant; the old run's files are deleted in the background while round 1 runs
+            trash_path = output_path.with_name(f"{output_path.name}.trash.{os.getpid()}")
+            os.rename(output_path, trash_path)
+            threading.Thread(target=shutil.rmtree, args=(trash_path,), kwargs={"ignore_errors": True}).start()
         os.makedirs(output_path)
     
-    initial_files = sorted([p for p in source_path.glob(f"**/*{args.extension}")])
+    # One scandir walk finds the files and their sizes, so batching never has to stat them again
+    file_sizes = dict(walk_files_with_sizes(source_path, args.extension, trash_path))
+    initial_files = sorted(file_sizes)
 
     if not initial_files:
-        print(f"[ERROR] No files with extension '{args.extension}' found in '{source_path}'.")
+        logger.error("[ERROR] No files with extension '%s' found in '%s'.", args.extension, source_path)
         return
 
-    print(f"Found {len(initial_files)} source files to process.")
+    logger.info("Found %s source files to process.", len(initial_files))
     current_files = initial_files
     round_count = 1
 
-    while len(current_files) > 1:
-        distilled_files = run_distillation_round(
-            current_files, round_count, output_path, args
-        )
-        if distilled_files is None:
-            print("\nAborting script due to an error in the distillation round.")
-            print("To continue, run the script again with the --resume flag.")
+    if len(current_files) > 1:
+        result = await run_distillation_pipeline(current_files, output_path, args, file_sizes)
+        if result is None:
+            logger.error("\nAborting script due to an error in the distillation round.")
+            logger.info("To continue, run the script again with the --resume flag.")
             return
-        current_files = distilled_files
-        round_count += 1
+        current_files, round_count = result
 
     if len(current_files) == 1 and round_count > 1:
         final_file = current_files[0]
         final_destination = output_path / "ULTRA_DISTILLED_SUMMARY.txt"
-        shutil.move(str(final_file), str(final_destination))
-        print("\n==============================================")
-        print("✅ Distillation Complete!")
-        print(f"The final summary has been saved as:")
-        print(f"   {final_destination}")
-        print("==============================================")
+        rename_or_move(final_file, final_destination)
+        logger.info("\n==============================================")
+        logger.info("✅ Distillation Complete!")
+        logger.info("The final summary has been saved as:")
+        logger.info("   %s", final_destination)
+        logger.info("==============================================")
     elif len(current_files) == 1 and round_count == 1:
-        print("\n[INFO] Only one batch was processed. The result is in the output folder.")
+        logger.info("\n[INFO] Only one batch was processed. The result is in the output folder.")
     elif not current_files:
-         print("\n[ERROR] No distilled files were produced in the last round. Aborting.")
+         logger.error("\n[ERROR] No distilled files were produced in the last round. Aborting.")
     else:
-        print(f"\n[INFO] Distillation finished. {len(current_files)} files remaining in the output directory.")
+        logger.info("\n[INFO] Distillation finished. %s files remaining in the output directory.", len(current_files))
+
+def _use_pidfd_child_watcher() -> None:
+    """
+    Before Python 3.12, asyncio waits on each child from its own thread blocked in waitpid.
+    Where the kernel supports pidfds, switch to PidfdChildWatcher so every child is
+    reaped from the event loop itself and max_workers children need no extra threads.
+    """
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, "PidfdChildWatcher"):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return
+    asyncio.set_child_watcher(asyncio.PidfdChildWatcher())
+
+def main():
+    """Runs the distillation pipeline on an asyncio event loop."""
+    _use_pidfd_child_watcher()
+    # Log records are queued and written by a listener thread, so the event loop never blocks on stdout
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    listener.start()
+    try:
+        asyncio.run(main_async())
+    finally:
+        listener.stop()
 
 if __name__ == "__main__":
     main()
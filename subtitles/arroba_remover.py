@@ -10,33 +10,31 @@ def remove_arroba_from_names(start_path):
     # Walk through the directory tree from the bottom up
     # This ensures files are renamed before their parent directories,
     # preventing issues with paths changing during traversal.
-    for dirpath, dirnames, filenames in os.walk(start_path, topdown=False):
+    # fwalk hands out an open fd for each directory, so the renames are
+    # resolved relative to it instead of walking the full path every time.
+    for dirpath, dirnames, filenames, dirfd in os.fwalk(start_path, topdown=False):
         # Rename files first
         for name in filenames:
             if '@' in name:
-                old_path = os.path.join(dirpath, name)
                 new_name = name.replace('@', '')
-                new_path = os.path.join(dirpath, new_name)
                 try:
-                    os.rename(old_path, new_path)
-                    print(f"Renamed file: '{old_path}' to '{new_path}'")
+                    os.rename(name, new_name, src_dir_fd=dirfd, dst_dir_fd=dirfd)
+                    print(f"Renamed file: '{os.path.join(dirpath, name)}' to '{os.path.join(dirpath, new_name)}'")
                 except OSError as e:
-                    print(f"Error renaming file '{old_path}': {e}")
+                    print(f"Error renaming file '{os.path.join(dirpath, name)}': {e}")
 
         # Rename directories
         # We need to iterate over a copy of dirnames because we might modify it
         for name in list(dirnames):
             if '@' in name:
-                old_path = os.path.join(dirpath, name)
                 new_name = name.replace('@', '')
-                new_path = os.path.join(dirpath, new_name)
                 try:
-                    os.rename(old_path, new_path)
-                    print(f"Renamed directory: '{old_path}' to '{new_path}'")
+                    os.rename(name, new_name, src_dir_fd=dirfd, dst_dir_fd=dirfd)
+                    print(f"Renamed directory: '{os.path.join(dirpath, name)}' to '{os.path.join(dirpath, new_name)}'")
                     # Update dirnames in place so os.walk continues correctly
                     dirnames[dirnames.index(name)] = new_name
                 except OSError as e:
-                    print(f"Error renaming directory '{old_path}': {e}")
+                    print(f"Error renaming directory '{os.path.join(dirpath, name)}': {e}")
 
     print("Finished processing.")
 
@@ -3,7 +3,7 @@ import subprocess
 import math
 import shutil
 from pathlib import Path
-import concurrent.futures
+import asyncio
 
 # --- CONFIGURATION ---
 # --- Please edit these variables to match your setup ---
@@ -53,55 +53,117 @@ PROMPT = (
 #    Example: "gemini-2.5-pro" or "gemini-1.5-flash"
 MODEL = "gemini-2.5-flash"
 
-# 6. The number of files to process in a single batch.
-BATCH_SIZE = 3
+# 6. The token budget of a single batch. Files are packed into one gemini call
+#    until their estimated size (bytes / BYTES_PER_TOKEN) would pass this value.
+#    Keep it below the model's context window, leaving room for the prompt.
+MAX_BATCH_TOKENS = 800_000
+BYTES_PER_TOKEN = 4
 
-# 7. Max number of concurrent workers (threads) for processing batches.
-#    Adjust based on your system's capabilities and API rate limits.
+# 7. Max number of gemini calls running at the same time.
+#    Adjust based on your API rate limits.
 MAX_WORKERS = 5
 
-# --- END OF CONFIGURATION ---
+# 8. Seconds to wait for a single gemini call before killing it.
+LLM_TIMEOUT = 300
 
+# --- END OF CONFIGURATION ---
 
-def create_batches(file_list, batch_size):
-    """Splits a list of files into smaller chunks (batches)."""
-    if not file_list:
-        return []
-    return [file_list[i:i + batch_size] for i in range(0, len(file_list), batch_size)]
 
-def _process_single_batch(batch, round_number, batch_number, output_dir):
+def find_files(root, extension):
+    """
+    Recursively collects the files under root whose names end in extension.
+    A plain suffix check on each os.scandir entry replaces glob's per-entry pattern matching.
+    """
+    found = []
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except OSError as e:
+            # glob skipped unreadable directories too
+            print(f"[WARNING] Skipping unreadable directory {directory}: {e}")
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(extension) and entry.is_file():
+                    found.append(Path(entry.path))
+    return found
+
+def create_batches(file_list, max_tokens):
     """
-    Helper function to process a single batch.
-    This function will be run in a separate thread.
+    Splits a list of files into batches, packing files in order until the estimated
+    token count of a batch would pass max_tokens.
+    A file that is over the budget on its own gets a batch to itself.
+    """
+    batches = []
+    current_batch = []
+    current_tokens = 0
+    for file_path in file_list:
+        file_tokens = file_path.stat().st_size // BYTES_PER_TOKEN
+        if file_tokens > max_tokens:
+            print(f"  -> Isolating large file into its own batch: {file_path.name} (~{file_tokens} tokens)")
+            batches.append([file_path])
+            continue
+        if current_batch and current_tokens + file_tokens > max_tokens:
+            batches.append(current_batch)
+            current_batch = []
+            current_tokens = 0
+        current_batch.append(file_path)
+        current_tokens += file_tokens
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+async def _process_single_batch(batch, round_number, batch_number, output_dir):
+    """
+    Coroutine that processes a single batch with one gemini child process.
     """
     print(f"  -> Processing Batch {batch_number} (Round {round_number})...")
 
-    # Convert the absolute path to a relative path from the current working directory.
-    # This now works for all rounds because `batch` always contains absolute paths.
-    file_references = " ".join([f"'@{str(file_path.relative_to(Path.cwd()))}'" for file_path in batch])
-
-    # Combine the main prompt and the file references into a single prompt string.
-    full_prompt = f"{PROMPT} {file_references}"
-
-    # The command now passes the combined prompt to the -p argument.
-    command_str = f"gemini -m {MODEL} -p \"{full_prompt}\""
+    # The prompt and the file contents go to gemini on stdin ("-p -"), so nothing
+    # has to be quoted for a shell and the argv stays small.
+    # Each file is headed by its name, since the title hints at subject and date.
+    command = ["gemini", "-m", MODEL, "-p", "-"]
 
     try:
-        # Using shell=True to correctly handle the complex, quoted prompt string.
-        result = subprocess.run(
-            command_str,
-            shell=True,
-            capture_output=True,
-            text=True,
-            check=True,
-            encoding='utf-8',
-            timeout=300
+        file_sections = [
+            f"--- {file_path.name} ---\n{file_path.read_text(encoding='utf-8')}"
+            for file_path in batch
+        ]
+        full_prompt = "\n\n".join([PROMPT, *file_sections])
+
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
         )
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(full_prompt.encode('utf-8')), LLM_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(command, LLM_TIMEOUT) from None
+        except asyncio.CancelledError:
+            # Another batch failed; don't leave this call running
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(
+                process.returncode, command,
+                stdout.decode('utf-8', errors='replace'), stderr.decode('utf-8', errors='replace')
+            )
 
         # `output_dir` is absolute, so `output_filename` will be too.
         output_filename = output_dir / f"round_{round_number}_batch_{batch_number}.txt"
         with open(output_filename, "w", encoding='utf-8') as f:
-            f.write(result.stdout)
+            f.write(stdout.decode('utf-8'))
 
         print(f"     Success! Saved distilled output to: {output_filename.name}")
         # Return the absolute path of the new file for the next round.
@@ -115,7 +177,7 @@ def _process_single_batch(batch, round_number, batch_number, output_dir):
         raise
     except subprocess.CalledProcessError as e:
         print(f"\n[ERROR] An error occurred while running the gemini-cli for Batch {batch_number}.")
-        print(f"  Command executed: {command_str}")
+        print(f"  Command executed: {' '.join(command)}")
         print(f"  Exit Code: {e.returncode}")
         print(f"  Stdout: {e.stdout}")
         print(f"  Stderr: {e.stderr}")
@@ -124,37 +186,47 @@ def _process_single_batch(batch, round_number, batch_number, output_dir):
         print(f"\n[ERROR] An unexpected error occurred for Batch {batch_number}: {e}")
         raise
 
-def run_distillation_round(input_files, round_number, output_path):
+async def _bounded(semaphore, coro_function, *coro_args):
+    """Runs coro_function(*coro_args) while holding one of the semaphore's MAX_WORKERS slots."""
+    async with semaphore:
+        return await coro_function(*coro_args)
+
+async def run_distillation_round(input_files, round_number, output_path):
     """
     Processes a list of input files in batches and generates distilled output files.
     """
     print(f"\n--- Starting Round {round_number} ---")
     print(f"Processing {len(input_files)} files in this round.")
 
-    batches = create_batches(input_files, BATCH_SIZE)
-    print(f"Divided into {len(batches)} batches of up to {BATCH_SIZE} files each.")
-
-    output_files = []
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Pass the absolute output_path to each worker thread.
-        future_to_batch_number = {
-            executor.submit(_process_single_batch, batch, round_number, i + 1, output_path): i + 1
-            for i, batch in enumerate(batches)
-        }
-
-        for future in concurrent.futures.as_completed(future_to_batch_number):
-            batch_number = future_to_batch_number[future]
-            try:
-                output_file = future.result()
-                if output_file:
-                    output_files.append(output_file)
-            except Exception as exc:
-                print(f"Batch {batch_number} generated an exception: {exc}")
-                executor.shutdown(wait=False, cancel_futures=True)
-                return None
-
-    return sorted(output_files, key=lambda p: p.name)
+    batches = create_batches(input_files, MAX_BATCH_TOKENS)
+    print(f"Divided into {len(batches)} batches of up to ~{MAX_BATCH_TOKENS} tokens each.")
+
+    # Outputs go in their batch's slot, which keeps batch order (batch_10 after batch_2) without sorting
+    output_files = [None] * len(batches)
+
+    semaphore = asyncio.Semaphore(MAX_WORKERS)
+    # Pass the absolute output_path to each batch.
+    task_to_batch_number = {
+        asyncio.create_task(_bounded(
+            semaphore, _process_single_batch, batch, round_number, i + 1, output_path
+        )): i + 1
+        for i, batch in enumerate(batches)
+    }
+
+    if task_to_batch_number:
+        done, pending = await asyncio.wait(task_to_batch_number, return_when=asyncio.FIRST_EXCEPTION)
+        failed = [task for task in sorted(done, key=task_to_batch_number.get) if task.exception() is not None]
+        if failed:
+            print(f"Batch {task_to_batch_number[failed[0]]} generated an exception: {failed[0].exception()}")
+            # Cancelling a task kills its gemini child process
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            return None
+        for task in done:
+            output_files[task_to_batch_number[task] - 1] = task.result()
+
+    return [f for f in output_files if f is not None]
 
 
 def main():
@@ -176,7 +248,7 @@ def main():
     print(f"Output will be saved in: '{output_path.resolve()}'")
 
     # Use resolve() to ensure we start with absolute paths.
-    initial_files = sorted([p for p in source_path.resolve().glob(f"**/*{FILE_EXTENSION}")])
+    initial_files = sorted(find_files(source_path.resolve(), FILE_EXTENSION))
 
     if not initial_files:
         print(f"[ERROR] No files with extension '{FILE_EXTENSION}' found in '{source_path}'.")
@@ -189,7 +261,7 @@ def main():
 
     while len(current_files) > 1:
         # Pass the absolute output_path to the distillation round function.
-        distilled_files = run_distillation_round(current_files, round_count, output_path)
+        distilled_files = asyncio.run(run_distillation_round(current_files, round_count, output_path))
 
         if distilled_files is None:
             print("\nAborting script due to an error in the distillation round.")
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import csv
+import io
 import sys
 from pathlib import Path
 import subprocess
@@ -47,16 +48,23 @@ def bulk_detect_languages(missions):
         return
 
     separator = "|||"
-    payload_lines = [f"{m['id']}{separator}{m['title']}" for m in missions]
-    payload = "\n".join(payload_lines)
-
-    prompt = (
+    # The instructions and the video list are written into one buffer, so the
+    # list is never held as separate lines plus a joined copy
+    buf = io.StringIO()
+    buf.write(
         f"Analyze the following list of videos in 'video_id{separator}title' format.\n"
         f"For each line, detect if the title is in Spanish ('es') or English ('en').\n"
         f"Respond ONLY with a CSV list with 'video_id,language' columns.\n"
-        f"Do not include headers. Your response must have exactly {len(payload_lines)} lines.\n\n"
-        f"VIDEO LIST:\n{payload}"
+        f"Do not include headers. Your response must have exactly {len(missions)} lines.\n\n"
+        f"VIDEO LIST:\n"
     )
+    for i, m in enumerate(missions):
+        if i:
+            buf.write("\n")
+        buf.write(m['id'])
+        buf.write(separator)
+        buf.write(m['title'])
+    prompt = buf.getvalue()
 
     print(f"Sending {len(missions)} titles to the LLM for analysis...")
     response_csv = llm_call(prompt)
@@ -81,9 +89,13 @@ def main():
 
     missions = []
     with mission_file.open(newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            missions.append({'id': row['Video ID'], 'title': row['Title']})
+        # Plain rows plus column indexes looked up once, instead of a dict per row
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is not None:
+            id_index = header.index('Video ID')
+            title_index = header.index('Title')
+            missions = [{'id': row[id_index], 'title': row[title_index]} for row in reader if row]
     
     bulk_detect_languages(missions)
 
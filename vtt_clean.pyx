@@ -0,0 +1,35 @@
+# cython: language_level=3
+"""
+Compiled version of the VTT cleaning loop from process_bookmarks_v3.py.
+Build in place with: python setup_vtt_clean.py build_ext --inplace
+"""
+
+import re
+
+# Same patterns as process_bookmarks_v3.py
+VTT_HEADER_PREFIXES = (b'WEBVTT', b'Kind:', b'Language:')
+HTML_TAG_RE = re.compile(r'<[^>]*>')
+
+def clean_vtt_lines(list raw_lines):
+    """
+    Takes the raw byte lines of a VTT file and returns the cleaned, de-duplicated
+    lines prefixed with '- ' (without trailing newlines).
+    """
+    cdef set seen_hashes = set()
+    cdef list output_lines = []
+    cdef bytes raw_line
+    cdef str line
+    cdef Py_hash_t line_hash
+    strip_tags = HTML_TAG_RE.sub
+    for raw_line in raw_lines:
+        # Skip header, metadata and timestamps
+        if raw_line.lstrip().startswith(VTT_HEADER_PREFIXES) or b'-->' in raw_line:
+            continue
+        line = ' '.join(strip_tags('', raw_line.decode('utf-8')).replace('&gt;&gt;', '').split())
+        if not line:
+            continue
+        line_hash = hash(line)
+        if line_hash not in seen_hashes:
+            seen_hashes.add(line_hash)
+            output_lines.append('- ' + line)
+    return output_lines